@@ -1,72 +1,222 @@
 """
 Cryptography manager for message encryption and decryption.
-Uses ChaCha20-Poly1305 AEAD for secure message encryption.
+Uses ChaCha20-Poly1305 or AES-256-GCM AEAD for secure message encryption.
+
+The AEAD comes from pyca/cryptography, which delegates to OpenSSL's EVP
+implementation; OpenSSL selects its SSSE3/AVX2/AVX-512 (or NEON) code
+path at load time from CPUID, so no separate SIMD backend is needed.
+AES-256-GCM is only preferred on CPUs with AES and carry-less multiply
+instructions, where it outruns ChaCha20-Poly1305.
 """
 
+import functools
+import platform
 import secrets
 import struct
 import time
-from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
-import gc
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
 
 from utils.logger import SecureLogger
+from utils.memory import secure_zero
 
 logger = SecureLogger('crypto_manager')
 
+# Precompiled wire-format structs
+_HEADER_STRUCT = struct.Struct('>BBQ')  # VERSION, TYPE, TIMESTAMP
+_TIMESTAMP_STRUCT = struct.Struct('>Q')
+_CHUNK_ID_STRUCT = struct.Struct('>I')
+
+
+@functools.lru_cache(maxsize=None)
+def has_aes_acceleration():
+    """
+    Check whether the CPU has hardware AES-GCM support.
+    
+    Looks for AES-NI + PCLMULQDQ on x86 and AES + PMULL on ARM in
+    /proc/cpuinfo. Platforms without /proc/cpuinfo report False.
+    
+    Returns:
+        bool: True if AES-GCM is hardware accelerated
+    """
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            cpuinfo = f.read()
+    except OSError:
+        return False
+    
+    flags = set()
+    for line in cpuinfo.splitlines():
+        if line.startswith(('flags', 'Features')):
+            flags.update(line.split(':', 1)[1].split())
+    
+    machine = platform.machine().lower()
+    if machine in ('x86_64', 'amd64', 'i386', 'i686'):
+        return {'aes', 'pclmulqdq'} <= flags
+    return {'aes', 'pmull'} <= flags
+
 
 class CryptoManager:
     """Manages encryption and decryption of messages."""
     
+    __slots__ = (
+        'session_key',
+        'cipher',
+        'cipher_suite',
+        '_nonce_prefix',
+        '_nonce_counter',
+        '_replay_highest_seq',
+        '_replay_bitmap',
+    )
+    
     # Message format constants
-    VERSION = 1
+    VERSION = 2
     TYPE_TEXT = 1
     TYPE_FILE = 2
     TYPE_HANDSHAKE = 3
     
+    # AEAD cipher suites negotiated during the handshake
+    SUITE_CHACHA20_POLY1305 = 1
+    SUITE_AES_256_GCM = 2
+    _SUITE_CIPHERS = {
+        SUITE_CHACHA20_POLY1305: ChaCha20Poly1305,
+        SUITE_AES_256_GCM: AESGCM,
+    }
+    
+    # Anti-replay sliding window size (in messages)
+    REPLAY_WINDOW_SIZE = 1024
+    _REPLAY_WINDOW_MASK = (1 << REPLAY_WINDOW_SIZE) - 1
+    
+    # Maximum accepted clock skew between peers (seconds)
+    MAX_CLOCK_SKEW = 300
+    
     def __init__(self):
         """Initialize crypto manager."""
         self.session_key = None
         self.cipher = None
-        self.used_nonces = set()
+        self.cipher_suite = None
+        self._nonce_prefix = None
+        self._nonce_counter = 0
+        self._reset_replay_window()
+    
+    @classmethod
+    def supported_suites(cls):
+        """
+        Get the supported cipher suites, most preferred first.
+        
+        Returns:
+            list: Cipher suite identifiers
+        """
+        if has_aes_acceleration():
+            return [cls.SUITE_AES_256_GCM, cls.SUITE_CHACHA20_POLY1305]
+        return [cls.SUITE_CHACHA20_POLY1305, cls.SUITE_AES_256_GCM]
     
-    def set_session_key(self, session_key):
+    @classmethod
+    def select_suite(cls, peer_suites):
+        """
+        Choose the cipher suite for a session.
+        
+        AES-256-GCM is only chosen when both peers prefer it, so a peer
+        without AES hardware never pays for software AES.
+        
+        Args:
+            peer_suites: Peer's supported suites, most preferred first
+            
+        Returns:
+            int: Selected cipher suite
+        """
+        local_suites = cls.supported_suites()
+        if peer_suites and peer_suites[0] == local_suites[0]:
+            return local_suites[0]
+        return cls.SUITE_CHACHA20_POLY1305
+    
+    def _reset_replay_window(self):
+        """Reset the receive-side anti-replay window."""
+        self._replay_highest_seq = -1
+        self._replay_bitmap = 0
+    
+    def set_session_key(self, session_key, cipher_suite=SUITE_CHACHA20_POLY1305):
         """
         Set the session key for encryption/decryption.
         
         Args:
             session_key: 32-byte session key
+            cipher_suite: Negotiated AEAD cipher suite
         """
+        if cipher_suite not in self._SUITE_CIPHERS:
+            raise ValueError(f"Unsupported cipher suite: {cipher_suite}")
+        
         self.session_key = session_key
-        self.cipher = ChaCha20Poly1305(session_key)
-        self.used_nonces.clear()
+        self.cipher = self._SUITE_CIPHERS[cipher_suite](session_key)
+        self.cipher_suite = cipher_suite
+        self._nonce_prefix = secrets.token_bytes(4)
+        self._nonce_counter = 0
+        self._reset_replay_window()
         logger.info("Session key set", event="session_key_set")
     
     def generate_nonce(self):
         """
         Generate a unique nonce for encryption.
         
-        With 12-byte (96-bit) nonces, collision probability is negligible.
-        Maximum 100 retries to prevent infinite loops in case of issues.
+        Nonces are built from a 4-byte random prefix chosen per session
+        and an 8-byte big-endian message counter, so they never repeat
+        within a session. Rekeying (see MessageHandler.should_rekey) keeps
+        the counter far from overflow.
         
         Returns:
             bytes: 12-byte nonce
         """
-        max_retries = 100
-        for attempt in range(max_retries):
-            nonce = secrets.token_bytes(12)
-            if nonce not in self.used_nonces:
-                return nonce
+        nonce = self._nonce_prefix + self._nonce_counter.to_bytes(8, 'big')
+        self._nonce_counter += 1
+        return nonce
+    
+    def _check_replay(self, seq):
+        """
+        Check a received sequence number against the anti-replay window.
+        
+        Args:
+            seq: Counter parsed from the received nonce
+            
+        Raises:
+            ValueError: If the sequence number is too old or already seen
+        """
+        if seq > self._replay_highest_seq:
+            return
+        
+        offset = self._replay_highest_seq - seq
+        if offset >= self.REPLAY_WINDOW_SIZE:
+            logger.warning("Nonce outside replay window - possible replay attack", event="security")
+            raise ValueError("Nonce outside replay window")
+        
+        if self._replay_bitmap & (1 << offset):
+            logger.warning("Nonce reuse detected - possible replay attack", event="security")
+            raise ValueError("Nonce reuse detected")
+    
+    def _update_replay_window(self, seq):
+        """
+        Mark a sequence number as seen in the anti-replay window.
         
-        # If we somehow exhaust retries (extremely unlikely), clear set and try once more
-        logger.warning("Nonce generation exhausted retries, clearing used nonces", event="nonce_generation")
-        self.used_nonces.clear()
-        return secrets.token_bytes(12)
+        Args:
+            seq: Counter parsed from an authenticated nonce
+        """
+        if seq > self._replay_highest_seq:
+            shift = seq - self._replay_highest_seq
+            if shift >= self.REPLAY_WINDOW_SIZE:
+                self._replay_bitmap = 1
+            else:
+                self._replay_bitmap = ((self._replay_bitmap << shift) | 1) & self._REPLAY_WINDOW_MASK
+            self._replay_highest_seq = seq
+        else:
+            self._replay_bitmap |= 1 << (self._replay_highest_seq - seq)
     
     def encrypt_message(self, plaintext, message_type=TYPE_TEXT, sender_id=b"self"):
         """
-        Encrypt a message using ChaCha20-Poly1305.
+        Encrypt a message with the session AEAD.
         
-        Format: [VERSION:1][TYPE:1][NONCE:12][CIPHERTEXT:variable][TAG:16]
+        Format: [VERSION:1][TYPE:1][TIMESTAMP:8][NONCE:12][CIPHERTEXT:variable][TAG:16]
+        
+        The timestamp travels in the clear but is bound to the ciphertext
+        through the AAD, so the receiver needs a single decryption.
         
         Args:
             plaintext: Message to encrypt (bytes or string)
@@ -86,22 +236,24 @@ class CryptoManager:
         # Generate unique nonce
         nonce = self.generate_nonce()
         
+        # Build the fixed-size header: [VERSION][TYPE][TIMESTAMP][NONCE]
+        header = _HEADER_STRUCT.pack(self.VERSION, message_type, int(time.time())) + nonce
+        
         # Create associated data (AAD) with timestamp and sender
-        timestamp = struct.pack('>Q', int(time.time()))
-        aad = timestamp + sender_id
+        aad = header[2:10] + sender_id
         
         # Encrypt
         ciphertext = self.cipher.encrypt(nonce, plaintext, aad)
         
-        # Build message: [VERSION][TYPE][NONCE][CIPHERTEXT+TAG]
-        message = struct.pack('BB', self.VERSION, message_type) + nonce + ciphertext
+        # Append ciphertext to the header in a single copy
+        message = header + ciphertext
         
         logger.debug(f"Encrypted message of {len(plaintext)} bytes", event="encrypt")
         return message
     
     def decrypt_message(self, encrypted_message, sender_id=b"peer"):
         """
-        Decrypt a message using ChaCha20-Poly1305.
+        Decrypt a message with the session AEAD.
         
         Args:
             encrypted_message: Encrypted message bytes
@@ -113,54 +265,36 @@ class CryptoManager:
         if self.cipher is None:
             raise ValueError("Session key not set")
         
-        if len(encrypted_message) < 30:  # VERSION(1) + TYPE(1) + NONCE(12) + TAG(16)
+        if len(encrypted_message) < 38:  # VERSION(1) + TYPE(1) + TIMESTAMP(8) + NONCE(12) + TAG(16)
             raise ValueError("Message too short")
         
         # Parse message header
         version = encrypted_message[0]
         message_type = encrypted_message[1]
-        nonce = encrypted_message[2:14]
-        ciphertext = encrypted_message[14:]
+        timestamp_bytes = encrypted_message[2:10]
+        nonce = encrypted_message[10:22]
+        ciphertext = encrypted_message[22:]
         
         if version != self.VERSION:
             raise ValueError(f"Unsupported message version: {version}")
         
-        # NOTE: Timestamp validation approach
-        # The timestamp is included in the AAD, so we need to know it for decryption.
-        # Current approach tries timestamps within ±5 minute window, which creates a timing
-        # side-channel. In production, consider:
-        # 1. Including timestamp in message header (not in AAD)
-        # 2. Using a sequence number instead of timestamp
-        # 3. Accepting any timestamp within window and validating after decryption
-        # For this implementation, we accept the timing side-channel as a known limitation.
-        
-        current_time = int(time.time())
-        
-        # Try timestamps within a reasonable window (±5 minutes)
-        plaintext = None
-        actual_timestamp = None
-        
-        for time_offset in range(-300, 301, 60):
-            try:
-                test_timestamp = current_time + time_offset
-                timestamp_bytes = struct.pack('>Q', test_timestamp)
-                aad = timestamp_bytes + sender_id
-                
-                plaintext = self.cipher.decrypt(nonce, ciphertext, aad)
-                actual_timestamp = test_timestamp
-                break
-            except Exception:
-                continue
-        
-        if plaintext is None:
-            raise ValueError("Decryption failed - invalid message or key")
+        # Enforce the freshness window before touching the ciphertext
+        actual_timestamp = _TIMESTAMP_STRUCT.unpack(timestamp_bytes)[0]
+        if abs(actual_timestamp - int(time.time())) > self.MAX_CLOCK_SKEW:
+            logger.warning("Message timestamp outside accepted window", event="security")
+            raise ValueError("Message timestamp outside accepted window")
         
-        # Check for nonce reuse (replay attack protection) after successful decryption
-        if nonce in self.used_nonces:
-            logger.warning("Nonce reuse detected - possible replay attack", event="security")
-            raise ValueError("Nonce reuse detected")
+        # Reject replayed nonces before spending time on decryption
+        seq = int.from_bytes(nonce[4:], 'big')
+        self._check_replay(seq)
+        
+        try:
+            plaintext = self.cipher.decrypt(nonce, ciphertext, timestamp_bytes + sender_id)
+        except InvalidTag:
+            raise ValueError("Decryption failed - invalid message or key")
         
-        self.used_nonces.add(nonce)
+        # Only authenticated messages may advance the replay window
+        self._update_replay_window(seq)
         
         logger.debug(f"Decrypted message of {len(plaintext)} bytes", event="decrypt")
         return plaintext, message_type, actual_timestamp
@@ -177,7 +311,7 @@ class CryptoManager:
             bytes: Encrypted chunk
         """
         # Use chunk number in AAD for ordering
-        chunk_id = struct.pack('>I', chunk_number)
+        chunk_id = _CHUNK_ID_STRUCT.pack(chunk_number)
         return self.encrypt_message(chunk, self.TYPE_FILE, sender_id=chunk_id)
     
     def decrypt_file_chunk(self, encrypted_chunk, chunk_number):
@@ -191,7 +325,7 @@ class CryptoManager:
         Returns:
             bytes: Decrypted chunk
         """
-        chunk_id = struct.pack('>I', chunk_number)
+        chunk_id = _CHUNK_ID_STRUCT.pack(chunk_number)
         plaintext, msg_type, _ = self.decrypt_message(encrypted_chunk, sender_id=chunk_id)
         
         if msg_type != self.TYPE_FILE:
@@ -199,15 +333,65 @@ class CryptoManager:
         
         return plaintext
     
+    def encrypt_file_stream(self, chunks, first_chunk_number=0):
+        """
+        Encrypt a sequence of file chunks.
+        
+        Produces the same per-chunk format as encrypt_file_chunk, but only
+        re-packs the header when the timestamp changes, so the per-chunk
+        cost is one nonce and one AEAD call.
+        
+        Args:
+            chunks: Iterable of file chunk bytes
+            first_chunk_number: Sequence number of the first chunk
+            
+        Yields:
+            bytes: Encrypted chunk
+        """
+        if self.cipher is None:
+            raise ValueError("Session key not set")
+        
+        encrypt = self.cipher.encrypt
+        pack_chunk_id = _CHUNK_ID_STRUCT.pack
+        current_time = None
+        header = None
+        timestamp = None
+        
+        for chunk_number, chunk in enumerate(chunks, first_chunk_number):
+            now = int(time.time())
+            if now != current_time:
+                current_time = now
+                header = _HEADER_STRUCT.pack(self.VERSION, self.TYPE_FILE, now)
+                timestamp = header[2:]
+            
+            nonce = self.generate_nonce()
+            aad = timestamp + pack_chunk_id(chunk_number)
+            yield header + nonce + encrypt(nonce, chunk, aad)
+    
+    def decrypt_file_stream(self, encrypted_chunks, first_chunk_number=0):
+        """
+        Decrypt a sequence of file chunks.
+        
+        Args:
+            encrypted_chunks: Iterable of encrypted chunk bytes
+            first_chunk_number: Sequence number of the first chunk
+            
+        Yields:
+            bytes: Decrypted chunk
+        """
+        for chunk_number, encrypted_chunk in enumerate(encrypted_chunks, first_chunk_number):
+            yield self.decrypt_file_chunk(encrypted_chunk, chunk_number)
+    
     def clear_session(self):
         """Clear session key and cipher from memory."""
         if self.session_key:
             self.session_key = bytearray(self.session_key)
-            for i in range(len(self.session_key)):
-                self.session_key[i] = 0
+            secure_zero(self.session_key)
             self.session_key = None
         
         self.cipher = None
-        self.used_nonces.clear()
-        gc.collect()
+        self.cipher_suite = None
+        self._nonce_prefix = None
+        self._nonce_counter = 0
+        self._reset_replay_window()
         logger.info("Session cleared", event="session_clear")
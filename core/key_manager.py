@@ -6,17 +6,19 @@ Handles Ed25519 signing keys and X25519 key exchange keys.
 import os
 import secrets
 import hashlib
+import struct
 from pathlib import Path
-from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
-from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives import hashes
 from argon2 import PasswordHasher
 from argon2.low_level import hash_secret_raw, Type
-import gc
 
 from utils.logger import SecureLogger
+from utils.memory import secure_zero
 
 logger = SecureLogger('key_manager')
 
@@ -24,6 +26,33 @@ logger = SecureLogger('key_manager')
 class KeyManager:
     """Manages cryptographic keys for the messenger."""
     
+    __slots__ = (
+        'keys_directory',
+        'identity_private',
+        'identity_public',
+        'signing_private',
+        'signing_public',
+        '_identity_public_bytes',
+        '_signing_public_bytes',
+        '_fingerprint',
+        '_argon2_cache',
+        '_argon2_cache_key',
+        '_storage_salt',
+    )
+    
+    # Key file format: [HEADER:4][SALT:32][NONCE:12][CIPHERTEXT:32][TAG:16]
+    # Header: [FORMAT_VERSION:1][TIME_COST:1][MEMORY_MIB:1][PARALLELISM:1]
+    KEY_FILE_VERSION = 1
+    
+    # Argon2id profile (OWASP: t=2, m=46 MiB, p=1)
+    ARGON2_TIME_COST = 2
+    ARGON2_MEMORY_COST = 47104  # KiB
+    ARGON2_PARALLELISM = 1
+    
+    # Key files written before the header existed: [SALT:32][NONCE:12][CIPHERTEXT:32][TAG:16]
+    LEGACY_KEY_FILE_SIZE = 92
+    LEGACY_ARGON2_PARAMS = (2, 102400, 8)
+    
     def __init__(self, keys_directory='data/keys'):
         """Initialize key manager."""
         self.keys_directory = keys_directory
@@ -34,6 +63,15 @@ class KeyManager:
         self.identity_public = None
         self.signing_private = None
         self.signing_public = None
+        self._identity_public_bytes = None
+        self._signing_public_bytes = None
+        self._fingerprint = None
+        
+        # Argon2id results for this process, keyed by a keyed hash of
+        # (password, salt) so the password itself is never stored
+        self._argon2_cache = {}
+        self._argon2_cache_key = secrets.token_bytes(32)
+        self._storage_salt = None
         
     def _set_directory_permissions(self):
         """Set secure permissions on keys directory (Unix only)."""
@@ -46,6 +84,7 @@ class KeyManager:
         """Generate X25519 key pair for key exchange."""
         self.identity_private = X25519PrivateKey.generate()
         self.identity_public = self.identity_private.public_key()
+        self._identity_public_bytes = self._serialize_public_key(self.identity_public)
         logger.info("Generated X25519 identity keys", event="key_generation")
         return self.identity_public
     
@@ -53,6 +92,8 @@ class KeyManager:
         """Generate Ed25519 key pair for signatures."""
         self.signing_private = Ed25519PrivateKey.generate()
         self.signing_public = self.signing_private.public_key()
+        self._signing_public_bytes = self._serialize_public_key(self.signing_public)
+        self._fingerprint = None
         logger.info("Generated Ed25519 signing keys", event="key_generation")
         return self.signing_public
     
@@ -63,61 +104,59 @@ class KeyManager:
         Args:
             password: Password for key encryption
         """
+        params = (self.ARGON2_TIME_COST, self.ARGON2_MEMORY_COST, self.ARGON2_PARALLELISM)
+        header = struct.pack(
+            'BBBB',
+            self.KEY_FILE_VERSION,
+            self.ARGON2_TIME_COST,
+            self.ARGON2_MEMORY_COST // 1024,
+            self.ARGON2_PARALLELISM
+        )
+        
+        # Reuse the current salt when its Argon2id output is already cached
+        salt = self._storage_salt
+        if salt is None or self._argon2_cache_id(password, salt, params) not in self._argon2_cache:
+            salt = secrets.token_bytes(32)
+        
         # Derive encryption key from password using Argon2id
-        salt = secrets.token_bytes(32)
-        encryption_key = hash_secret_raw(
-            secret=password.encode(),
-            salt=salt,
-            time_cost=2,
-            memory_cost=102400,
-            parallelism=8,
-            hash_len=32,
-            type=Type.ID
+        encryption_key = self._derive_storage_key(password, salt, params)
+        cipher = ChaCha20Poly1305(encryption_key)
+        
+        # Serialize and encrypt identity private key
+        identity_private_bytes = self.identity_private.private_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PrivateFormat.Raw,
+            encryption_algorithm=serialization.NoEncryption()
         )
+        identity_encrypted = self._encrypt_key(identity_private_bytes, cipher)
+        
+        # Serialize and encrypt signing private key
+        signing_private_bytes = self.signing_private.private_bytes(
+            encoding=serialization.Encoding.Raw,
+            format=serialization.PrivateFormat.Raw,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+        signing_encrypted = self._encrypt_key(signing_private_bytes, cipher)
+        
+        # Save encrypted keys with KDF parameters and salt
+        identity_path = os.path.join(self.keys_directory, 'identity.key')
+        signing_path = os.path.join(self.keys_directory, 'signing.key')
         
+        with open(identity_path, 'wb') as f:
+            f.write(header + salt + identity_encrypted)
+        
+        with open(signing_path, 'wb') as f:
+            f.write(header + salt + signing_encrypted)
+        
+        # Set file permissions (Unix only)
         try:
-            # Serialize and encrypt identity private key
-            identity_private_bytes = self.identity_private.private_bytes(
-                encoding=serialization.Encoding.Raw,
-                format=serialization.PrivateFormat.Raw,
-                encryption_algorithm=serialization.NoEncryption()
-            )
-            identity_encrypted = self._encrypt_key(identity_private_bytes, encryption_key)
-            
-            # Serialize and encrypt signing private key
-            signing_private_bytes = self.signing_private.private_bytes(
-                encoding=serialization.Encoding.Raw,
-                format=serialization.PrivateFormat.Raw,
-                encryption_algorithm=serialization.NoEncryption()
-            )
-            signing_encrypted = self._encrypt_key(signing_private_bytes, encryption_key)
-            
-            # Save encrypted keys with salt
-            identity_path = os.path.join(self.keys_directory, 'identity.key')
-            signing_path = os.path.join(self.keys_directory, 'signing.key')
-            
-            with open(identity_path, 'wb') as f:
-                f.write(salt + identity_encrypted)
-            
-            with open(signing_path, 'wb') as f:
-                f.write(salt + signing_encrypted)
-            
-            # Set file permissions (Unix only)
-            try:
-                os.chmod(identity_path, 0o600)
-                os.chmod(signing_path, 0o600)
-            except Exception:
-                pass
-            
-            logger.info("Keys saved to disk", event="key_save")
-            
-        finally:
-            # Clear sensitive data from memory
-            if 'encryption_key' in locals():
-                encryption_key = bytearray(encryption_key)
-                for i in range(len(encryption_key)):
-                    encryption_key[i] = 0
-            gc.collect()
+            os.chmod(identity_path, 0o600)
+            os.chmod(signing_path, 0o600)
+        except Exception:
+            pass
+        
+        self._storage_salt = salt
+        logger.info("Keys saved to disk", event="key_save")
     
     def load_keys(self, password):
         """
@@ -138,62 +177,113 @@ class KeyManager:
             
             # Load identity key
             with open(identity_path, 'rb') as f:
-                data = f.read()
-            salt = data[:32]
-            identity_encrypted = data[32:]
+                params, salt, identity_encrypted = self._parse_key_file(f.read())
             
             # Derive encryption key
-            encryption_key = hash_secret_raw(
-                secret=password.encode(),
-                salt=salt,
-                time_cost=2,
-                memory_cost=102400,
-                parallelism=8,
-                hash_len=32,
-                type=Type.ID
-            )
+            encryption_key = self._derive_storage_key(password, salt, params)
+            cipher = ChaCha20Poly1305(encryption_key)
             
-            identity_private_bytes = self._decrypt_key(identity_encrypted, encryption_key)
+            identity_private_bytes = self._decrypt_key(identity_encrypted, cipher)
             self.identity_private = X25519PrivateKey.from_private_bytes(identity_private_bytes)
             self.identity_public = self.identity_private.public_key()
+            self._identity_public_bytes = self._serialize_public_key(self.identity_public)
             
             # Load signing key
             with open(signing_path, 'rb') as f:
-                data = f.read()
-            salt = data[:32]
-            signing_encrypted = data[32:]
+                _, _, signing_encrypted = self._parse_key_file(f.read())
             
-            signing_private_bytes = self._decrypt_key(signing_encrypted, encryption_key)
+            signing_private_bytes = self._decrypt_key(signing_encrypted, cipher)
             self.signing_private = Ed25519PrivateKey.from_private_bytes(signing_private_bytes)
             self.signing_public = self.signing_private.public_key()
+            self._signing_public_bytes = self._serialize_public_key(self.signing_public)
+            self._fingerprint = None
             
+            self._storage_salt = salt
             logger.info("Keys loaded from disk", event="key_load")
             return True
             
         except Exception as e:
             logger.error(f"Failed to load keys: {e}", event="key_load_error")
             return False
-        finally:
-            if 'encryption_key' in locals():
-                encryption_key = bytearray(encryption_key)
-                for i in range(len(encryption_key)):
-                    encryption_key[i] = 0
-            gc.collect()
     
-    def _encrypt_key(self, key_bytes, encryption_key):
-        """Encrypt key bytes using ChaCha20-Poly1305."""
-        from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+    def _parse_key_file(self, data):
+        """
+        Split a key file into its KDF parameters, salt and encrypted key.
         
-        cipher = ChaCha20Poly1305(encryption_key)
+        Args:
+            data: Raw key file contents
+            
+        Returns:
+            tuple: ((time_cost, memory_cost, parallelism), salt, encrypted_key)
+        """
+        if len(data) == self.LEGACY_KEY_FILE_SIZE:
+            return self.LEGACY_ARGON2_PARAMS, data[:32], data[32:]
+        
+        version, time_cost, memory_mib, parallelism = struct.unpack('BBBB', data[:4])
+        if version != self.KEY_FILE_VERSION:
+            raise ValueError(f"Unsupported key file version: {version}")
+        
+        return (time_cost, memory_mib * 1024, parallelism), data[4:36], data[36:]
+    
+    def _argon2_cache_id(self, password, salt, params):
+        """Compute the Argon2id cache key for a (password, salt, params) tuple."""
+        return hashlib.blake2b(
+            password.encode() + salt + struct.pack('>III', *params),
+            key=self._argon2_cache_key,
+            digest_size=16
+        ).digest()
+    
+    def _derive_storage_key(self, password, salt, params):
+        """
+        Derive the key-file encryption key from a password using Argon2id.
+        
+        Results are cached per (password, salt, params) for the lifetime of
+        this instance, so saving after loading with the same password does
+        not pay for a second Argon2id run.
+        
+        Args:
+            password: Password for key encryption
+            salt: 32-byte salt
+            params: (time_cost, memory_cost, parallelism) tuple
+            
+        Returns:
+            bytearray: 32-byte encryption key, owned by the cache
+        """
+        cache_id = self._argon2_cache_id(password, salt, params)
+        encryption_key = self._argon2_cache.get(cache_id)
+        if encryption_key is None:
+            time_cost, memory_cost, parallelism = params
+            encryption_key = bytearray(hash_secret_raw(
+                secret=password.encode(),
+                salt=salt,
+                time_cost=time_cost,
+                memory_cost=memory_cost,
+                parallelism=parallelism,
+                hash_len=32,
+                type=Type.ID
+            ))
+            self._argon2_cache[cache_id] = encryption_key
+        return encryption_key
+    
+    def clear_key_cache(self):
+        """
+        Wipe and forget the cached Argon2id outputs.
+        
+        Call once no further save_keys with the same password is expected;
+        the next save or load derives its key again.
+        """
+        for encryption_key in self._argon2_cache.values():
+            secure_zero(encryption_key)
+        self._argon2_cache.clear()
+    
+    def _encrypt_key(self, key_bytes, cipher):
+        """Encrypt key bytes using a ChaCha20-Poly1305 cipher."""
         nonce = secrets.token_bytes(12)
         ciphertext = cipher.encrypt(nonce, key_bytes, None)
         return nonce + ciphertext
     
-    def _decrypt_key(self, encrypted_data, encryption_key):
-        """Decrypt key bytes using ChaCha20-Poly1305."""
-        from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
-        
-        cipher = ChaCha20Poly1305(encryption_key)
+    def _decrypt_key(self, encrypted_data, cipher):
+        """Decrypt key bytes using a ChaCha20-Poly1305 cipher."""
         nonce = encrypted_data[:12]
         ciphertext = encrypted_data[12:]
         return cipher.decrypt(nonce, ciphertext, None)
@@ -208,8 +298,6 @@ class KeyManager:
         Returns:
             bytes: Shared secret
         """
-        from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PublicKey
-        
         peer_public_key = X25519PublicKey.from_public_bytes(peer_public_key_bytes)
         shared_secret = self.identity_private.exchange(peer_public_key)
         return shared_secret
@@ -218,6 +306,10 @@ class KeyManager:
         """
         Derive session key from shared secret using HKDF.
         
+        HKDF-SHA256 runs once per handshake on a 32-byte secret, so its
+        cost is a handful of SHA-256 compressions and not worth a
+        protocol change to another KDF.
+        
         Args:
             shared_secret: Shared secret from key exchange
             salt: Random salt
@@ -259,8 +351,6 @@ class KeyManager:
         Returns:
             bool: True if signature is valid
         """
-        from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
-        
         try:
             public_key = Ed25519PublicKey.from_public_bytes(public_key_bytes)
             public_key.verify(signature, data)
@@ -268,10 +358,40 @@ class KeyManager:
         except Exception:
             return False
     
+    def verify_signatures_batch(self, items):
+        """
+        Verify several Ed25519 signatures in one call.
+        
+        Public keys are parsed once per distinct key, so verifying many
+        signatures from the same peer skips repeated point decoding.
+        
+        Args:
+            items: Iterable of (data, signature, public_key_bytes) tuples
+            
+        Returns:
+            list: One bool per item, True if that signature is valid
+        """
+        public_keys = {}
+        results = []
+        for data, signature, public_key_bytes in items:
+            try:
+                public_key = public_keys.get(public_key_bytes)
+                if public_key is None:
+                    public_key = Ed25519PublicKey.from_public_bytes(public_key_bytes)
+                    public_keys[public_key_bytes] = public_key
+                public_key.verify(signature, data)
+                results.append(True)
+            except Exception:
+                results.append(False)
+        return results
+    
     def get_fingerprint(self, public_key_bytes=None):
         """
         Get SHA256 fingerprint of public key.
         
+        Fingerprints are compared out-of-band and stored in the contacts
+        table, so the hash must stay SHA-256 for existing contacts to match.
+        
         Args:
             public_key_bytes: Public key bytes (uses own if None)
             
@@ -279,25 +399,30 @@ class KeyManager:
             str: Hex-encoded fingerprint
         """
         if public_key_bytes is None:
-            public_key_bytes = self.signing_public.public_bytes(
-                encoding=serialization.Encoding.Raw,
-                format=serialization.PublicFormat.Raw
-            )
+            # Own fingerprint is computed once per signing key
+            if self._fingerprint is None:
+                self._fingerprint = self._format_fingerprint(self._signing_public_bytes)
+            return self._fingerprint
         
-        fingerprint = hashlib.sha256(public_key_bytes).hexdigest()
-        # Format as XX:XX:XX:...
-        return ':'.join(fingerprint[i:i+2] for i in range(0, len(fingerprint), 2))
+        return self._format_fingerprint(public_key_bytes)
+    
+    @staticmethod
+    def _format_fingerprint(public_key_bytes):
+        """Hash public key bytes and format as XX:XX:XX:..."""
+        return hashlib.sha256(public_key_bytes).digest().hex(':')
     
     def get_identity_public_bytes(self):
         """Get identity public key as bytes."""
-        return self.identity_public.public_bytes(
-            encoding=serialization.Encoding.Raw,
-            format=serialization.PublicFormat.Raw
-        )
+        return self._identity_public_bytes
     
     def get_signing_public_bytes(self):
         """Get signing public key as bytes."""
-        return self.signing_public.public_bytes(
+        return self._signing_public_bytes
+    
+    @staticmethod
+    def _serialize_public_key(public_key):
+        """Serialize a public key to raw bytes."""
+        return public_key.public_bytes(
             encoding=serialization.Encoding.Raw,
             format=serialization.PublicFormat.Raw
         )
@@ -11,19 +11,58 @@ logger = SecureLogger('message_handler')
 class MessageHandler:
     """Handles processing of different message types."""
     
-    def __init__(self, crypto_manager, key_manager):
+    __slots__ = (
+        'crypto_manager',
+        'key_manager',
+        'message_callbacks',
+        'message_count',
+        'session_start_time',
+        '_rekey_deadline',
+        '_next_time_check',
+        '_peer_id_bytes',
+        '_self_id_bytes',
+    )
+    
+    # Rekeying thresholds
+    REKEY_MESSAGE_THRESHOLD = 1000
+    REKEY_TIME_THRESHOLD = 86400  # seconds
+    
+    # The time threshold is only re-checked every 64 messages
+    REKEY_TIME_CHECK_INTERVAL = 64
+    
+    def __init__(self, crypto_manager, key_manager, peer_id="peer", self_id="self"):
         """
         Initialize message handler.
         
         Args:
             crypto_manager: CryptoManager instance
             key_manager: KeyManager instance
+            peer_id: Peer identifier used in the AAD of received messages
+            self_id: Local identifier used in the AAD of sent messages
         """
         self.crypto_manager = crypto_manager
         self.key_manager = key_manager
         self.message_callbacks = {}
         self.message_count = 0
         self.session_start_time = time.time()
+        self._rekey_deadline = time.monotonic() + self.REKEY_TIME_THRESHOLD
+        self._next_time_check = self.REKEY_TIME_CHECK_INTERVAL
+        self._peer_id_bytes = self._encode_id(peer_id)
+        self._self_id_bytes = self._encode_id(self_id)
+    
+    @staticmethod
+    def _encode_id(identifier):
+        """Encode an identifier to bytes for use in the AAD."""
+        return identifier.encode() if isinstance(identifier, str) else identifier
+    
+    def set_peer(self, peer_id):
+        """
+        Set the peer identifier used for received messages.
+        
+        Args:
+            peer_id: Peer identifier (str or bytes)
+        """
+        self._peer_id_bytes = self._encode_id(peer_id)
     
     def register_callback(self, message_type, callback):
         """
@@ -35,27 +74,33 @@ class MessageHandler:
         """
         self.message_callbacks[message_type] = callback
     
-    def handle_text_message(self, encrypted_message, peer_id="peer"):
+    def handle_text_message(self, encrypted_message, peer_id=None):
         """
         Handle incoming text message.
         
         Args:
             encrypted_message: Encrypted message bytes
-            peer_id: Peer identifier
+            peer_id: Peer identifier (defaults to the one set via set_peer)
             
         Returns:
             str: Decrypted message text
         """
+        sender_id = self._peer_id_bytes if peer_id is None else self._encode_id(peer_id)
         try:
             plaintext, msg_type, timestamp = self.crypto_manager.decrypt_message(
                 encrypted_message,
-                sender_id=peer_id.encode() if isinstance(peer_id, str) else peer_id
+                sender_id=sender_id
             )
             
             self.message_count += 1
             
-            # Check if rekeying is needed
-            if self.should_rekey():
+            # Check if rekeying is needed (time only every 64 messages);
+            # sends also advance the count, so compare against a threshold
+            rekey = self.message_count >= self.REKEY_MESSAGE_THRESHOLD
+            if not rekey and self.message_count >= self._next_time_check:
+                self._next_time_check = self.message_count + self.REKEY_TIME_CHECK_INTERVAL
+                rekey = self.should_rekey()
+            if rekey:
                 logger.info("Rekeying threshold reached", event="rekey")
             
             return plaintext.decode('utf-8')
@@ -85,22 +130,23 @@ class MessageHandler:
             logger.error(f"Failed to decrypt file chunk: {e}", event="decrypt_error")
             raise
     
-    def prepare_text_message(self, text, sender_id="self"):
+    def prepare_text_message(self, text, sender_id=None):
         """
         Prepare text message for sending.
         
         Args:
             text: Message text
-            sender_id: Sender identifier
+            sender_id: Sender identifier (defaults to the local identifier)
             
         Returns:
             bytes: Encrypted message
         """
+        sender_id = self._self_id_bytes if sender_id is None else self._encode_id(sender_id)
         try:
             encrypted = self.crypto_manager.encrypt_message(
                 text,
                 self.crypto_manager.TYPE_TEXT,
-                sender_id=sender_id.encode() if isinstance(sender_id, str) else sender_id
+                sender_id=sender_id
             )
             self.message_count += 1
             return encrypted
@@ -132,17 +178,13 @@ class MessageHandler:
         Returns:
             bool: True if rekeying is needed
         """
-        # Check message count threshold
-        if self.message_count >= 1000:
-            return True
-        
-        # Check time threshold (24 hours)
-        if time.time() - self.session_start_time >= 86400:
-            return True
-        
-        return False
+        # Check message count threshold, then time threshold (24 hours)
+        return (self.message_count >= self.REKEY_MESSAGE_THRESHOLD
+                or time.monotonic() >= self._rekey_deadline)
     
     def reset_session_counters(self):
         """Reset session counters after rekeying."""
         self.message_count = 0
         self.session_start_time = time.time()
+        self._rekey_deadline = time.monotonic() + self.REKEY_TIME_THRESHOLD
+        self._next_time_check = self.REKEY_TIME_CHECK_INTERVAL
@@ -6,7 +6,9 @@ Handles TCP connections, threading, and message sending/receiving.
 import socket
 import threading
 import time
-import queue
+import collections
+import hmac
+import selectors
 import secrets
 import sys
 import os
@@ -21,9 +23,37 @@ if os.environ.get('NETWORK_DEBUG', '1') == '1':
     logger.logger.setLevel('DEBUG')
 
 
+def _ignore_event(*args):
+    """Default callback for events nobody registered for."""
+
+
 class NetworkManager:
     """Manages P2P network connections."""
     
+    # Seconds between heartbeats once the handshake is complete
+    HEARTBEAT_INTERVAL = 30
+    
+    # Upper bounds on bytes and buffers coalesced into a single send
+    SEND_BATCH_LIMIT = 65536
+    SEND_BATCH_MAX_PARTS = 64  # well below IOV_MAX for sendmsg
+    # Free space guaranteed for each recv, and the receive buffer's
+    # resting capacity
+    RECV_CHUNK_SIZE = 65536
+    RECV_BUFFER_SIZE = 2 * RECV_CHUNK_SIZE
+    # Events accepted by register_callback, each stored as on_<event>
+    CALLBACK_EVENTS = ('text_message', 'handshake_complete', 'disconnect')
+    # TCP keepalive: probe after 15 s idle, every 5 s, give up after 3
+    KEEPALIVE_IDLE = 15
+    KEEPALIVE_INTERVAL = 5
+    KEEPALIVE_COUNT = 3
+    # Text messages allowed to wait for a slow peer before sends are refused
+    SEND_QUEUE_LIMIT = 1024
+    # Seconds allowed for queued messages to drain on disconnect
+    DISCONNECT_FLUSH_TIMEOUT = 1.0
+    # Pending connections queued by the kernel; extras are turned away
+    # promptly instead of timing out in the backlog
+    LISTEN_BACKLOG = 128
+    
     def __init__(self, key_manager, crypto_manager, message_handler):
         """
         Initialize network manager.
@@ -44,28 +74,68 @@ class NetworkManager:
         self.connection_info = {}
         
         # Threading
-        self.receive_thread = None
-        self.send_thread = None
-        self.heartbeat_thread = None
+        self.io_thread = None
         self.stop_event = threading.Event()
         
-        # Message queues
-        self.send_queue = queue.Queue()
-        self.receive_callbacks = {}
+        # Outbound frames; deque operations are atomic, the wake socket
+        # interrupts the I/O thread's select
+        self.send_queue = collections.deque()
+        self._wake_reader = None
+        self._wake_writer = None
+        # Wakes the accept thread's select when the server stops
+        self._accept_wake_writer = None
+        
+        # Event callbacks, replaced through register_callback
+        self.on_text_message = _ignore_event
+        self.on_handshake_complete = _ignore_event
+        self.on_disconnect = _ignore_event
+        
+        # I/O thread state; recv writes straight into the parse buffer,
+        # with unparsed bytes between _recv_offset and _recv_length
+        self._recv_buffer = bytearray(self.RECV_BUFFER_SIZE)
+        # Long-lived view for recv_into and decoding; released before the
+        # buffer is resized, since a bytearray can't change size while viewed
+        self._recv_view = memoryview(self._recv_buffer)
+        self._recv_offset = 0
+        self._recv_length = 0
+        self._recv_frame_end = Protocol.HEADER_SIZE
+        self._pending_send = []
+        self._last_send_time = 0.0
         
         # Handshake state
         self.handshake_complete = False
         self.peer_identity_key = None
         self.peer_signing_key = None
         self.challenge = None
+        self.cipher_suite = self.crypto_manager.SUITE_CHACHA20_POLY1305
+        self._hello_credentials = None
+        self._hello_frame = None
+        
+        # Inbound message handlers, looked up once per message
+        self._dispatch = {
+            MessageType.HELLO: self._handle_hello,
+            MessageType.HELLO_ACK: self._handle_hello_ack,
+            MessageType.CHALLENGE_RESPONSE: self._handle_challenge_response,
+            MessageType.READY: self._handle_ready,
+            MessageType.TEXT_MESSAGE: self._handle_text_message,
+            MessageType.HEARTBEAT: _ignore_event,  # Connection alive
+            MessageType.DISCONNECT: self._handle_disconnect,
+        }
     
-    def start_server(self, host='0.0.0.0', port=5555):
+    def start_server(self, host='0.0.0.0', port=5555, rcvbuf=None, sndbuf=None,
+                     reuse_port=False):
         """
         Start server mode (listening for connections).
         
         Args:
-            host: Host address to bind to
+            host: Host address to bind to (IPv4 or IPv6; '::' is dual-stack)
             port: Port number to listen on
+            rcvbuf: Optional SO_RCVBUF size in bytes (None keeps kernel autotuning)
+            sndbuf: Optional SO_SNDBUF size in bytes (None keeps kernel autotuning)
+            reuse_port: Set SO_REUSEPORT so several server processes can bind
+                the same port and the kernel spreads incoming connections
+                across them. Off by default: any process of the same user
+                could then bind the port and take a share of connections.
             
         Returns:
             bool: True if successful, False otherwise
@@ -83,34 +153,46 @@ class NetworkManager:
         try:
             logger.info(f"Attempting to create server socket on {host}:{port}", event="server_start")
             
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            logger.debug(f"Socket created: {self.socket}", event="server_start")
+            # IPv6 literals get an IPv6 socket; '::' also accepts IPv4 peers
+            family = socket.AF_INET6 if ':' in host else socket.AF_INET
+            self.socket = socket.socket(family, socket.SOCK_STREAM)
+            logger.debug("Socket created: %s", self.socket, event="server_start")
+            
+            if family == socket.AF_INET6 and host == '::':
+                self.socket.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
             
             # Enable address reuse - CRUCIAL for avoiding "Address already in use"
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             logger.debug("SO_REUSEADDR option enabled", event="server_start")
             
-            # On macOS, also enable SO_REUSEPORT
-            if sys.platform == 'darwin':
+            # On macOS (or when requested), also enable SO_REUSEPORT
+            if reuse_port or sys.platform == 'darwin':
                 try:
                     self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
-                    logger.debug("SO_REUSEPORT option enabled (macOS)", event="server_start")
+                    logger.debug("SO_REUSEPORT option enabled", event="server_start")
                 except (AttributeError, OSError) as e:
                     # SO_REUSEPORT may not be available on all systems
                     logger.debug(f"SO_REUSEPORT not available: {e}", event="server_start")
             
+            # Set before listen() so accepted sockets inherit the sizes
+            self._apply_buffer_sizes(self.socket, rcvbuf, sndbuf)
+            
             self.socket.bind((host, port))
             logger.info(f"Socket bound to {host}:{port}", event="server_start")
             
-            self.socket.listen(1)
-            logger.info(f"Socket listening with backlog=1", event="server_start")
+            self.socket.listen(self.LISTEN_BACKLOG)
+            logger.info(f"Socket listening with backlog={self.LISTEN_BACKLOG}", event="server_start")
             
             self.is_server = True
             
             logger.info(f"Server started successfully on {host}:{port}", event="server_start")
             
-            # Start accept thread
-            accept_thread = threading.Thread(target=self._accept_connection)
+            # Start accept thread; it waits on the listening socket and a
+            # wake socket instead of polling accept() with a timeout
+            self.socket.setblocking(False)
+            wake_reader, self._accept_wake_writer = socket.socketpair()
+            accept_thread = threading.Thread(target=self._accept_connection,
+                                             args=(wake_reader,))
             accept_thread.daemon = True
             accept_thread.start()
             logger.debug("Accept thread started", event="server_start")
@@ -149,14 +231,16 @@ class NetworkManager:
             self.is_server = False
             return False
     
-    def connect_to_peer(self, host, port, timeout=10):
+    def connect_to_peer(self, host, port, timeout=10, rcvbuf=None, sndbuf=None):
         """
         Connect to a peer in client mode.
         
         Args:
-            host: Peer host address
+            host: Peer host address (IPv4, IPv6 or host name)
             port: Peer port number
             timeout: Connection timeout in seconds
+            rcvbuf: Optional SO_RCVBUF size in bytes (None keeps kernel autotuning)
+            sndbuf: Optional SO_SNDBUF size in bytes (None keeps kernel autotuning)
             
         Returns:
             bool: True if successful, False otherwise
@@ -174,25 +258,15 @@ class NetworkManager:
         try:
             logger.info(f"Attempting to connect to {host}:{port}", event="connection")
             
-            # Validate IP address
-            try:
-                socket.inet_aton(host)
-                logger.debug(f"IP address is valid: {host}", event="connection")
-            except socket.error:
-                logger.error(f"Invalid IP address format: {host}", event="connection_error")
-                return False
-            
-            self.peer_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            logger.debug(f"Client socket created: {self.peer_socket}", event="connection")
+            # Sign and encode HELLO before dialing so it goes out as soon as
+            # the TCP handshake completes
+            self._get_hello_frame()
             
-            self.peer_socket.settimeout(timeout)
-            logger.debug(f"Socket timeout set to {timeout} seconds", event="connection")
-            
-            logger.info(f"Connecting to {host}:{port}...", event="connection")
-            self.peer_socket.connect((host, port))
+            self.peer_socket = self._open_connection(host, port, timeout, rcvbuf, sndbuf)
             
             # Remove timeout for normal operations
             self.peer_socket.settimeout(None)
+            self._configure_peer_socket(self.peer_socket)
             
             self.is_connected = True
             self.connection_info = {'host': host, 'port': port}
@@ -271,18 +345,133 @@ class NetworkManager:
                 self.peer_socket = None
             return False
     
-    def _accept_connection(self):
-        """Accept incoming connection (server mode)."""
+    def _open_connection(self, host, port, timeout, rcvbuf, sndbuf):
+        """
+        Connect to the first reachable address the host resolves to.
+        
+        Accepts IPv4 and IPv6 literals as well as host names.
+        
+        Args:
+            host: Peer host address or name
+            port: Peer port number
+            timeout: Connection timeout in seconds, per address
+            rcvbuf: Optional SO_RCVBUF size in bytes
+            sndbuf: Optional SO_SNDBUF size in bytes
+            
+        Returns:
+            socket.socket: Connected socket
+            
+        Raises:
+            OSError: Error from the last address tried (socket.gaierror if
+                the host does not resolve)
+        """
+        last_error = None
+        for family, socktype, proto, _, address in socket.getaddrinfo(
+                host, port, type=socket.SOCK_STREAM):
+            sock = socket.socket(family, socktype, proto)
+            logger.debug("Client socket created: %s", sock, event="connection")
+            try:
+                sock.settimeout(timeout)
+                
+                # Set before connect() so the TCP window scale is negotiated
+                self._apply_buffer_sizes(sock, rcvbuf, sndbuf)
+                
+                logger.info(f"Connecting to {address[0]}:{address[1]}...", event="connection")
+                sock.connect(address)
+                return sock
+            except OSError as e:
+                sock.close()
+                last_error = e
+            except Exception:
+                sock.close()
+                raise
+        
+        raise last_error
+    
+    @staticmethod
+    def _apply_buffer_sizes(sock, rcvbuf, sndbuf):
+        """
+        Apply explicit socket buffer sizes when requested.
+        
+        Setting either size disables the kernel's buffer autotuning for
+        that direction, which usually hurts throughput on high-latency
+        links; leave both as None unless a fixed size is really needed.
+        
+        Args:
+            sock: Socket to configure
+            rcvbuf: SO_RCVBUF size in bytes, or None
+            sndbuf: SO_SNDBUF size in bytes, or None
+        """
+        for option, size, name in ((socket.SO_RCVBUF, rcvbuf, 'SO_RCVBUF'),
+                                   (socket.SO_SNDBUF, sndbuf, 'SO_SNDBUF')):
+            if size is None:
+                continue
+            sock.setsockopt(socket.SOL_SOCKET, option, size)
+            # Linux doubles the requested value for bookkeeping overhead
+            actual = sock.getsockopt(socket.SOL_SOCKET, option)
+            logger.debug("%s requested %d, effective %d", name, size, actual, event="socket_options")
+    
+    @classmethod
+    def _configure_peer_socket(cls, sock):
+        """
+        Set latency and liveness options on a connected socket.
+        
+        Nagle's algorithm is disabled because handshake frames are small
+        request/response pairs that would otherwise wait on the peer's
+        delayed ACK; bulk sends are already coalesced by the I/O loop.
+        TCP keepalive lets the kernel detect a vanished peer even while
+        neither side has anything to send.
+        
+        Args:
+            sock: Connected TCP socket
+        """
+        options = [
+            (socket.IPPROTO_TCP, 'TCP_NODELAY', 1),
+            (socket.SOL_SOCKET, 'SO_KEEPALIVE', 1),
+            (socket.IPPROTO_TCP, 'TCP_KEEPIDLE', cls.KEEPALIVE_IDLE),
+            (socket.IPPROTO_TCP, 'TCP_KEEPINTVL', cls.KEEPALIVE_INTERVAL),
+            (socket.IPPROTO_TCP, 'TCP_KEEPCNT', cls.KEEPALIVE_COUNT),
+        ]
+        for level, name, value in options:
+            # Keepalive tuning options are missing on some platforms
+            option = getattr(socket, name, None)
+            if option is None:
+                continue
+            try:
+                sock.setsockopt(level, option, value)
+            except OSError as e:
+                logger.debug("%s not available: %s", name, e, event="socket_options")
+    
+    def _accept_connection(self, wake_reader):
+        """
+        Accept incoming connection (server mode).
+        
+        Args:
+            wake_reader: Socket that becomes readable when the server stops
+        """
+        server_socket = self.socket
+        selector = selectors.DefaultSelector()
         try:
             logger.info("Waiting for incoming connection...", event="server")
             logger.debug("Accept thread running, socket ready to accept", event="server")
             
-            # Set a timeout to allow periodic checking of stop_event
-            self.socket.settimeout(1.0)
+            selector.register(server_socket, selectors.EVENT_READ)
+            selector.register(wake_reader, selectors.EVENT_READ)
             
             while not self.stop_event.is_set() and self.is_server:
+                for key, _ in selector.select():
+                    if key.fileobj is wake_reader:
+                        return
+                
                 try:
-                    self.peer_socket, addr = self.socket.accept()
+                    sock, addr = server_socket.accept()
+                    
+                    # One peer per session; keep accepting only to refuse others
+                    if self.is_connected:
+                        self._reject_connection(sock, addr)
+                        continue
+                    
+                    self.peer_socket = sock
                     self.is_connected = True
                     self.connection_info = {'host': addr[0], 'port': addr[1]}
                     
@@ -290,111 +479,385 @@ class NetworkManager:
                     
                     # Remove timeout for normal communication
                     self.peer_socket.settimeout(None)
+                    self._configure_peer_socket(self.peer_socket)
                     
                     # Start threads
                     self._start_communication_threads()
                     
-                    break  # Connection accepted, exit loop
-                    
-                except socket.timeout:
-                    # Timeout is expected - continue loop to check stop_event
+                except BlockingIOError:
+                    # The pending connection went away before accept()
                     continue
                     
         except Exception as e:
             if not self.stop_event.is_set():
                 logger.error(f"Error accepting connection: {e}", event="server_error")
+        finally:
+            selector.close()
+            wake_reader.close()
+    
+    @staticmethod
+    def _reject_connection(sock, addr):
+        """
+        Refuse an extra incoming connection while a peer is connected.
+        
+        Args:
+            sock: Accepted socket to refuse
+            addr: Remote address of the socket
+        """
+        logger.warning(f"Rejecting connection from {addr[0]}:{addr[1]}: already connected", event="connection")
+        try:
+            sock.sendall(Protocol.create_disconnect("busy"))
+        except OSError:
+            pass
+        finally:
+            sock.close()
     
     def _start_communication_threads(self):
-        """Start send, receive, and heartbeat threads."""
+        """Start the I/O thread for the connected peer."""
         self.stop_event.clear()
         
-        logger.debug("Starting communication threads", event="threads")
+        logger.debug("Starting I/O thread", event="threads")
         
-        self.receive_thread = threading.Thread(target=self._receive_loop)
-        self.receive_thread.daemon = True
-        self.receive_thread.start()
-        logger.debug("Receive thread started", event="threads")
+        self._reset_connection_state()
         
-        self.send_thread = threading.Thread(target=self._send_loop)
-        self.send_thread.daemon = True
-        self.send_thread.start()
-        logger.debug("Send thread started", event="threads")
+        # A socket pair rather than os.pipe so it is selectable on Windows
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
         
-        self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop)
-        self.heartbeat_thread.daemon = True
-        self.heartbeat_thread.start()
-        logger.debug("Heartbeat thread started", event="threads")
+        self.io_thread = threading.Thread(target=self._io_loop)
+        self.io_thread.daemon = True
+        self.io_thread.start()
+        logger.debug("I/O thread started", event="threads")
     
-    def _receive_loop(self):
-        """Receive messages from peer."""
-        buffer = b''
+    def _reset_connection_state(self):
+        """
+        Clear per-connection state so the manager can be reused.
         
-        while not self.stop_event.is_set() and self.is_connected:
-            try:
-                data = self.peer_socket.recv(4096)
-                if not data:
-                    logger.info("Peer disconnected", event="disconnect")
-                    self.disconnect()
-                    break
+        The application keeps one NetworkManager across connections; key
+        material caches and the receive buffer's memory are kept, while
+        anything tied to the previous peer is dropped.
+        """
+        # Handshake state
+        self.handshake_complete = False
+        self.peer_identity_key = None
+        self.peer_signing_key = None
+        self.challenge = None
+        self.cipher_suite = self.crypto_manager.SUITE_CHACHA20_POLY1305
+        
+        # Nothing queued for the old peer may reach the new one
+        self.send_queue.clear()
+        self._pending_send = []
+        self._last_send_time = time.monotonic()
+        
+        # Rewind the pooled receive buffer instead of reallocating it
+        self._recv_offset = 0
+        self._recv_length = 0
+        self._recv_frame_end = Protocol.HEADER_SIZE
+    
+    def _io_loop(self):
+        """Multiplex receiving, sending and heartbeats on one thread."""
+        sock = self.peer_socket
+        wake_reader = self._wake_reader
+        wake_writer = self._wake_writer
+        selector = selectors.DefaultSelector()
+        want_write = False
+        
+        try:
+            sock.setblocking(False)
+            selector.register(sock, selectors.EVENT_READ)
+            selector.register(wake_reader, selectors.EVENT_READ)
+            
+            while not self.stop_event.is_set() and self.is_connected:
+                next_heartbeat = self._last_send_time + self.HEARTBEAT_INTERVAL
+                events = selector.select(max(0.0, next_heartbeat - time.monotonic()))
                 
-                buffer += data
+                for key, mask in events:
+                    if key.fileobj is wake_reader:
+                        self._drain_wake(wake_reader)
+                    elif mask & selectors.EVENT_READ and not self._receive_available():
+                        return
                 
-                # Process all complete messages in buffer
-                while len(buffer) >= 4:
-                    msg_type, payload, buffer = Protocol.decode_message(buffer)
-                    
-                    if msg_type is None:
-                        break
-                    
-                    self._handle_received_message(msg_type, payload)
-                    
-            except socket.timeout:
-                continue
-            except Exception as e:
+                # Heartbeat only after a full interval without any other send
+                now = time.monotonic()
+                if now >= self._last_send_time + self.HEARTBEAT_INTERVAL:
+                    self._last_send_time = now
+                    # A backlog already proves nothing is idle
+                    if self.handshake_complete and not self.send_queue:
+                        self.send_queue.append(Protocol.create_heartbeat())
+                
+                # Only wait for writability while the kernel buffer is full
+                if self._flush_sends() == want_write:
+                    want_write = not want_write
+                    selector.modify(sock, selectors.EVENT_READ |
+                                    (selectors.EVENT_WRITE if want_write else 0))
+        except Exception as e:
+            if not self.stop_event.is_set():
+                logger.error(f"Connection error: {e}", event="io_error")
+        finally:
+            selector.close()
+            if self.peer_socket is sock:
+                self._drain_for_close()
+                # Peer left or failed rather than disconnect(): drop the
+                # peer and keep listening
                 if not self.stop_event.is_set():
-                    logger.error(f"Receive error: {e}", event="receive_error")
+                    self._drop_connection()
+            wake_reader.close()
+            # A reconnect may already have replaced the wake pair
+            wake_writer.close()
+    
+    def _receive_available(self):
+        """
+        Read what the socket has and process every complete frame.
+        
+        Returns:
+            bool: False if the peer closed the connection or sent DISCONNECT
+        """
+        buffer = self._recv_buffer
+        view = self._recv_view
+        offset = self._recv_offset
+        length = self._recv_length
+        
+        # Make room for a full read: move the unparsed tail to the front,
+        # and grow only for a frame larger than the buffer
+        if len(buffer) - length < self.RECV_CHUNK_SIZE:
+            if offset:
+                buffer[:length - offset] = buffer[offset:length]
+                self._recv_frame_end -= offset
+                length -= offset
+                offset = 0
+            needed = max(length + self.RECV_CHUNK_SIZE, self._recv_frame_end)
+            if needed > len(buffer):
+                view.release()
+                buffer.extend(bytes(needed - len(buffer)))
+                view = self._recv_view = memoryview(buffer)
+            self._recv_offset = offset
+            self._recv_length = length
+        
+        try:
+            with view[length:] as tail:
+                received = self.peer_socket.recv_into(tail)
+        except (BlockingIOError, InterruptedError):
+            return True
+        
+        if not received:
+            logger.info("Peer disconnected", event="disconnect")
+            return False
+        
+        length += received
+        self._recv_length = length
+        
+        # Don't re-parse a partial frame until its bytes have arrived
+        if length < self._recv_frame_end:
+            return True
+        
+        # Process all complete messages in buffer
+        while True:
+            decoded = Protocol.decode_next(view, offset, length)
+            if decoded is None:
                 break
+            
+            msg_type, payload, offset = decoded
+            self._handle_received_message(msg_type, payload)
+            # Nothing the peer sends after DISCONNECT is processed
+            if msg_type == MessageType.DISCONNECT:
+                return False
+        
+        # Fully drained: rewind, and give back memory grown for a large frame
+        if offset == length:
+            offset = length = 0
+            if len(buffer) > self.RECV_BUFFER_SIZE:
+                view.release()
+                buffer = self._recv_buffer = bytearray(self.RECV_BUFFER_SIZE)
+                view = self._recv_view = memoryview(buffer)
+        
+        self._recv_offset = offset
+        self._recv_length = length
+        self._recv_frame_end = Protocol.frame_end(view, offset, length)
+        return True
+    
+    def _enqueue(self, message):
+        """
+        Queue a message for the I/O thread.
+        
+        Args:
+            message: Encoded protocol message
+        """
+        self.send_queue.append(message)
+        self._wake()
     
-    def _send_loop(self):
-        """Send messages from queue."""
-        while not self.stop_event.is_set() and self.is_connected:
+    def _wake(self):
+        """Interrupt the I/O thread's select."""
+        wake_writer = self._wake_writer
+        if wake_writer is not None:
             try:
-                message = self.send_queue.get(timeout=1)
-                self.peer_socket.sendall(message)
-            except queue.Empty:
-                continue
-            except Exception as e:
-                if not self.stop_event.is_set():
-                    logger.error(f"Send error: {e}", event="send_error")
+                wake_writer.send(b'\0')
+            except OSError:
+                # Wake buffer full (a wake-up is already pending) or closed
+                pass
+    
+    @staticmethod
+    def _drain_wake(wake_reader):
+        """
+        Discard pending wake-up bytes.
+        
+        Args:
+            wake_reader: Read end of the I/O thread's wake socket pair
+        """
+        try:
+            while wake_reader.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+    
+    def _collect_send_batch(self):
+        """
+        Take queued messages for one send, up to the batch limits.
+        
+        Returns:
+            list: Messages in queue order (empty if nothing is queued)
+        """
+        parts = []
+        size = 0
+        
+        while size < self.SEND_BATCH_LIMIT and len(parts) < self.SEND_BATCH_MAX_PARTS:
+            try:
+                message = self.send_queue.popleft()
+            except IndexError:
                 break
+            parts.append(message)
+            size += len(message)
+        
+        return parts
     
-    def _heartbeat_loop(self):
-        """Send periodic heartbeat messages."""
-        while not self.stop_event.is_set() and self.is_connected:
+    def _flush_sends(self):
+        """
+        Write queued messages until the queue is empty or the socket is full.
+        
+        Batches are written with scatter-gather sendmsg so they are not
+        copied into one buffer first; where sendmsg is unavailable
+        (Windows) each batch is joined instead.
+        
+        Returns:
+            bool: True if everything queued has been written
+        """
+        while True:
+            if not self._pending_send:
+                parts = self._collect_send_batch()
+                if not parts:
+                    return True
+                if len(parts) > 1 and not hasattr(self.peer_socket, 'sendmsg'):
+                    parts = [b''.join(parts)]
+                self._pending_send = [memoryview(part) for part in parts]
+            
             try:
-                time.sleep(30)
-                if self.handshake_complete:
-                    heartbeat = Protocol.create_heartbeat()
-                    self.send_queue.put(heartbeat)
-            except Exception as e:
-                logger.error(f"Heartbeat error: {e}", event="heartbeat_error")
+                self._write_pending()
+            except (BlockingIOError, InterruptedError):
+                return False
+    
+    def _drain_for_close(self):
+        """
+        Write whatever is still queued, then half-close the socket.
+        
+        The FIN follows the written bytes, so the peer reads everything
+        (including our DISCONNECT) before seeing end of stream.
+        """
+        sock = self.peer_socket
+        if sock is None:
+            return
+        try:
+            sock.settimeout(self.DISCONNECT_FLUSH_TIMEOUT)
+            self._flush_sends()
+            sock.shutdown(socket.SHUT_WR)
+        except Exception as e:
+            logger.debug(f"Error draining socket before close: {e}", event="disconnect")
+    
+    def _drop_connection(self):
+        """
+        Tear down a peer connection that ended on the I/O thread.
+        
+        Used when the peer closes the stream, sends DISCONNECT or breaks
+        the protocol. Unlike disconnect(), which is for local shutdown, a
+        server keeps listening so the next peer is accepted instead of
+        being turned away as busy.
+        """
+        sock = self.peer_socket
+        self.peer_socket = None
+        self.is_connected = False
+        self.handshake_complete = False
+        try:
+            sock.close()
+        except Exception as e:
+            logger.debug(f"Error closing peer socket: {e}", event="disconnect")
+        logger.info("Peer connection closed", event="disconnect")
+        
+        # Notify UI
+        self.on_disconnect()
+    
+    def _write_pending(self):
+        """Write the pending batch, resuming after partial writes."""
+        buffers = self._pending_send
+        while buffers:
+            if len(buffers) == 1:
+                sent = self.peer_socket.send(buffers[0])
+            else:
+                sent = self.peer_socket.sendmsg(buffers)
+            self._last_send_time = time.monotonic()
+            
+            # Drop fully sent buffers and trim a partially sent one
+            while buffers and sent >= len(buffers[0]):
+                sent -= len(buffers[0])
+                buffers.pop(0)
+            if buffers and sent:
+                buffers[0] = buffers[0][sent:]
+    
+    def _get_hello_credentials(self):
+        """
+        Get our public keys and the signature over our identity key.
+        
+        Ed25519 signatures are deterministic, so the signed identity only
+        changes when the keys do and is computed once per key pair.
+        
+        Returns:
+            tuple: (identity_public_bytes, signing_public_bytes, signature)
+        """
+        identity_key = self.key_manager.get_identity_public_bytes()
+        signing_key = self.key_manager.get_signing_public_bytes()
+        
+        cached = self._hello_credentials
+        if cached is None or cached[0] is not identity_key or cached[1] is not signing_key:
+            cached = (identity_key, signing_key, self.key_manager.sign_data(identity_key))
+            self._hello_credentials = cached
+        return cached
+    
+    def _get_hello_frame(self):
+        """
+        Get the encoded HELLO message for our current keys.
+        
+        Returns:
+            bytes: HELLO frame, rebuilt only when the keys change
+        """
+        credentials = self._get_hello_credentials()
+        cached = self._hello_frame
+        if cached is None or cached[0] is not credentials:
+            identity_key, signing_key, signature = credentials
+            frame = Protocol.create_hello(
+                identity_key, signing_key, signature,
+                self.crypto_manager.supported_suites()
+            )
+            cached = (credentials, frame)
+            self._hello_frame = cached
+        return cached[1]
     
     def _initiate_handshake(self):
         """Initiate handshake as client."""
         try:
             logger.info("Initiating handshake protocol", event="handshake")
             
-            # Create HELLO message
-            identity_key = self.key_manager.get_identity_public_bytes()
-            signing_key = self.key_manager.get_signing_public_bytes()
-            signature = self.key_manager.sign_data(identity_key)
-            
-            logger.debug("Identity and signing keys prepared", event="handshake")
-            
-            hello_msg = Protocol.create_hello(identity_key, signing_key, signature)
-            logger.debug(f"HELLO message created, size: {len(hello_msg)} bytes", event="handshake")
+            hello_msg = self._get_hello_frame()
+            logger.debug("HELLO message created, size: %d bytes", len(hello_msg), event="handshake")
             
-            self.send_queue.put(hello_msg)
+            self._enqueue(hello_msg)
             
             logger.info("HELLO message queued for sending", event="handshake")
             
@@ -409,63 +872,61 @@ class NetworkManager:
             msg_type: MessageType
             payload: Message payload
         """
+        handler = self._dispatch.get(msg_type)
+        if handler is None:
+            logger.warning("Unknown message type: %s", msg_type, event="unknown_message")
+            return
+        
         try:
-            if msg_type == MessageType.HELLO:
-                self._handle_hello(payload)
-            elif msg_type == MessageType.HELLO_ACK:
-                self._handle_hello_ack(payload)
-            elif msg_type == MessageType.CHALLENGE_RESPONSE:
-                self._handle_challenge_response(payload)
-            elif msg_type == MessageType.READY:
-                self._handle_ready(payload)
-            elif msg_type == MessageType.TEXT_MESSAGE:
-                self._handle_text_message(payload)
-            elif msg_type == MessageType.HEARTBEAT:
-                pass  # Heartbeat received, connection alive
-            elif msg_type == MessageType.DISCONNECT:
-                self._handle_disconnect(payload)
-            else:
-                logger.warning(f"Unknown message type: {msg_type}", event="unknown_message")
-                
+            handler(payload)
         except Exception as e:
             logger.error(f"Error handling message: {e}", event="message_error")
     
     def _handle_hello(self, payload):
         """Handle HELLO message (server receiving)."""
+        # Only the first HELLO to a server is answered; checked before any crypto
+        if not self.is_server or self.handshake_complete or self.challenge is not None:
+            logger.warning("Unexpected HELLO ignored", event="security")
+            return
+        
         try:
             logger.debug("Processing HELLO message", event="handshake")
             
-            # Extract peer keys
-            self.peer_identity_key = bytes.fromhex(payload['identity_key'])
-            self.peer_signing_key = bytes.fromhex(payload['signing_key'])
-            signature = bytes.fromhex(payload['signature'])
+            # Extract peer keys; kept only once the signature verifies
+            peer_identity_key = payload['identity_key']
+            peer_signing_key = payload['signing_key']
+            signature = payload['signature']
             
-            logger.debug(f"Peer identity key extracted: {len(self.peer_identity_key)} bytes", event="handshake")
-            logger.debug(f"Peer signing key extracted: {len(self.peer_signing_key)} bytes", event="handshake")
+            logger.debug("Peer identity key extracted: %d bytes", len(peer_identity_key), event="handshake")
+            logger.debug("Peer signing key extracted: %d bytes", len(peer_signing_key), event="handshake")
             
             # Verify signature
             if not self.key_manager.verify_signature(
-                self.peer_identity_key, signature, self.peer_signing_key
+                peer_identity_key, signature, peer_signing_key
             ):
                 logger.error("Invalid signature in HELLO message", event="handshake_error")
                 logger.warning("SECURITY: Signature verification failed - possible MITM attack", event="security")
                 return
             
             logger.info("✓ Signature verified successfully", event="handshake")
+            self.peer_identity_key = peer_identity_key
+            self.peer_signing_key = peer_signing_key
+            
+            # Pick the AEAD both sides run fastest (peers without the field get ChaCha20)
+            self.cipher_suite = self.crypto_manager.select_suite(payload['cipher_suites'])
+            logger.debug("Cipher suite selected: %d", self.cipher_suite, event="handshake")
             
             # Generate challenge
             self.challenge = secrets.token_bytes(32)
-            logger.debug(f"Challenge generated: {len(self.challenge)} bytes", event="handshake")
+            logger.debug("Challenge generated: %d bytes", len(self.challenge), event="handshake")
             
             # Send HELLO_ACK
-            identity_key = self.key_manager.get_identity_public_bytes()
-            signing_key = self.key_manager.get_signing_public_bytes()
-            signature = self.key_manager.sign_data(identity_key)
+            identity_key, signing_key, signature = self._get_hello_credentials()
             
             hello_ack = Protocol.create_hello_ack(
-                identity_key, signing_key, signature, self.challenge
+                identity_key, signing_key, signature, self.challenge, self.cipher_suite
             )
-            self.send_queue.put(hello_ack)
+            self._enqueue(hello_ack)
             
             logger.info("HELLO received and verified, HELLO_ACK sent", event="handshake")
             
@@ -478,44 +939,57 @@ class NetworkManager:
     
     def _handle_hello_ack(self, payload):
         """Handle HELLO_ACK message (client receiving)."""
+        # Only the first HELLO_ACK to a client is answered; checked before any crypto
+        if self.is_server or self.handshake_complete or self.peer_identity_key is not None:
+            logger.warning("Unexpected HELLO_ACK ignored", event="security")
+            return
+        
         try:
             logger.debug("Processing HELLO_ACK message", event="handshake")
             
-            # Extract peer keys
-            self.peer_identity_key = bytes.fromhex(payload['identity_key'])
-            self.peer_signing_key = bytes.fromhex(payload['signing_key'])
-            signature = bytes.fromhex(payload['signature'])
-            challenge = bytes.fromhex(payload['challenge'])
+            # Extract peer keys; kept only once the signature verifies
+            peer_identity_key = payload['identity_key']
+            peer_signing_key = payload['signing_key']
+            signature = payload['signature']
+            challenge = payload['challenge']
+            suite = payload['cipher_suite']
             
-            logger.debug(f"Peer keys and challenge extracted", event="handshake")
+            logger.debug("Peer keys and challenge extracted", event="handshake")
             
             # Verify signature
             if not self.key_manager.verify_signature(
-                self.peer_identity_key, signature, self.peer_signing_key
+                peer_identity_key, signature, peer_signing_key
             ):
                 logger.error("Invalid signature in HELLO_ACK", event="handshake_error")
                 logger.warning("SECURITY: Signature verification failed - possible MITM attack", event="security")
                 return
             
             logger.info("✓ HELLO_ACK signature verified", event="handshake")
+            cipher_suite = suite[0] if suite else self.crypto_manager.SUITE_CHACHA20_POLY1305
             
-            # Perform key exchange
+            # Perform key exchange; set_session_key rejects an unknown suite
             logger.debug("Performing ECDH key exchange", event="handshake")
-            shared_secret = self.key_manager.perform_key_exchange(self.peer_identity_key)
+            shared_secret = self.key_manager.perform_key_exchange(peer_identity_key)
             salt = secrets.token_bytes(32)
             session_key = self.key_manager.derive_session_key(shared_secret, salt)
-            self.crypto_manager.set_session_key(session_key)
+            self.crypto_manager.set_session_key(session_key, cipher_suite)
             logger.info("✓ Session key derived and set", event="handshake")
             
             # Sign challenge response
             response_signature = self.key_manager.sign_data(challenge)
             logger.debug("Challenge signed", event="handshake")
             
+            # Peer state is kept only once nothing left can fail, so a
+            # rejected HELLO_ACK does not block a later valid one
+            self.peer_identity_key = peer_identity_key
+            self.peer_signing_key = peer_signing_key
+            self.cipher_suite = cipher_suite
+            
             # Send CHALLENGE_RESPONSE
             challenge_response = Protocol.create_challenge_response(
                 challenge, response_signature
             )
-            self.send_queue.put(challenge_response)
+            self._enqueue(challenge_response)
             
             logger.info("HELLO_ACK verified, CHALLENGE_RESPONSE sent", event="handshake")
             
@@ -531,16 +1005,18 @@ class NetworkManager:
         try:
             logger.debug("Processing CHALLENGE_RESPONSE", event="handshake")
             
-            response = bytes.fromhex(payload['response'])
-            signature = bytes.fromhex(payload['signature'])
+            response = payload['response']
+            signature = payload['signature']
             
-            # Verify challenge response
-            if response != self.challenge:
+            # Verify challenge response (constant time; each challenge answers once)
+            challenge = self.challenge
+            if challenge is None or not hmac.compare_digest(response, challenge):
                 logger.error("Invalid challenge response - challenge mismatch", event="handshake_error")
                 logger.warning("SECURITY: Challenge verification failed", event="security")
                 return
             
             logger.debug("✓ Challenge response matches", event="handshake")
+            self.challenge = None
             
             # Verify signature
             if not self.key_manager.verify_signature(
@@ -557,19 +1033,18 @@ class NetworkManager:
             shared_secret = self.key_manager.perform_key_exchange(self.peer_identity_key)
             salt = secrets.token_bytes(32)
             session_key = self.key_manager.derive_session_key(shared_secret, salt)
-            self.crypto_manager.set_session_key(session_key)
+            self.crypto_manager.set_session_key(session_key, self.cipher_suite)
             logger.info("✓ Session key derived and set", event="handshake")
             
             # Send READY
             ready_msg = Protocol.create_ready()
-            self.send_queue.put(ready_msg)
+            self._enqueue(ready_msg)
             
             self.handshake_complete = True
             logger.info("✓✓✓ HANDSHAKE COMPLETE (server) ✓✓✓", event="handshake")
             
             # Notify UI
-            if 'handshake_complete' in self.receive_callbacks:
-                self.receive_callbacks['handshake_complete']()
+            self.on_handshake_complete()
             
         except KeyError as e:
             logger.error(f"Missing field in CHALLENGE_RESPONSE: {e}", event="handshake_error")
@@ -580,12 +1055,16 @@ class NetworkManager:
     
     def _handle_ready(self, payload):
         """Handle READY message (client receiving)."""
+        # Only a client that verified the server's HELLO_ACK may complete
+        if self.is_server or self.handshake_complete or self.peer_identity_key is None:
+            logger.warning("Unexpected READY ignored", event="security")
+            return
+        
         self.handshake_complete = True
         logger.info("✓✓✓ HANDSHAKE COMPLETE (client) ✓✓✓", event="handshake")
         
         # Notify UI
-        if 'handshake_complete' in self.receive_callbacks:
-            self.receive_callbacks['handshake_complete']()
+        self.on_handshake_complete()
     
     def _handle_text_message(self, payload):
         """Handle TEXT_MESSAGE."""
@@ -598,17 +1077,15 @@ class NetworkManager:
             message_text = self.message_handler.handle_text_message(payload)
             
             # Notify UI
-            if 'text_message' in self.receive_callbacks:
-                self.receive_callbacks['text_message'](message_text)
+            self.on_text_message(message_text)
                 
         except Exception as e:
             logger.error(f"Error handling text message: {e}", event="message_error")
     
     def _handle_disconnect(self, payload):
-        """Handle DISCONNECT message."""
+        """Handle DISCONNECT message; the I/O loop then drops the peer."""
         reason = payload.get('reason', 'unknown')
         logger.info(f"Peer disconnected: {reason}", event="disconnect")
-        self.disconnect()
     
     def send_text_message(self, text):
         """
@@ -616,11 +1093,20 @@ class NetworkManager:
         
         Args:
             text: Message text
+            
+        Returns:
+            bool: True if queued, False otherwise
         """
         if not self.handshake_complete:
             logger.warning("Cannot send message before handshake", event="send_error")
             return False
         
+        # Refuse rather than block the caller (the GUI thread) when the
+        # peer is not keeping up; the queue would otherwise grow unbounded
+        if len(self.send_queue) >= self.SEND_QUEUE_LIMIT:
+            logger.warning("Send queue full, peer is not keeping up", event="send_error")
+            return False
+        
         try:
             # Encrypt message
             encrypted = self.message_handler.prepare_text_message(text)
@@ -629,7 +1115,7 @@ class NetworkManager:
             protocol_msg = Protocol.create_text_message(encrypted)
             
             # Queue for sending
-            self.send_queue.put(protocol_msg)
+            self._enqueue(protocol_msg)
             
             return True
             
@@ -642,30 +1128,39 @@ class NetworkManager:
         Register a callback for network events.
         
         Args:
-            event_type: Type of event ('text_message', 'handshake_complete', etc.)
+            event_type: Type of event ('text_message', 'handshake_complete'
+                or 'disconnect')
             callback: Function to call
+            
+        Raises:
+            ValueError: If event_type is not a known event
         """
-        self.receive_callbacks[event_type] = callback
+        if event_type not in self.CALLBACK_EVENTS:
+            raise ValueError(f"Unknown network event: {event_type}")
+        setattr(self, 'on_' + event_type, callback)
     
     def disconnect(self):
         """Disconnect from peer."""
         logger.info("Initiating disconnect sequence", event="disconnect")
         
-        if self.is_connected:
-            try:
-                # Send disconnect message
-                disconnect_msg = Protocol.create_disconnect()
-                self.send_queue.put(disconnect_msg)
-                time.sleep(0.5)  # Give time to send
-                logger.debug("Disconnect message sent", event="disconnect")
-            except Exception as e:
-                logger.debug(f"Error sending disconnect message: {e}", event="disconnect")
+        was_connected = self.is_connected
+        if was_connected:
+            # Queued behind any pending messages; flushed by _drain_for_close
+            self.send_queue.append(Protocol.create_disconnect())
         
         self.is_connected = False
         self.handshake_complete = False
         self.stop_event.set()
+        self._wake()
         logger.debug("Stop event set, threads will terminate", event="disconnect")
         
+        # Let the I/O thread flush what is queued instead of sleeping
+        io_thread = self.io_thread
+        if io_thread is not None and io_thread is not threading.current_thread():
+            io_thread.join(self.DISCONNECT_FLUSH_TIMEOUT)
+        elif was_connected:
+            self._drain_for_close()
+        
         # Close peer socket
         if self.peer_socket:
             try:
@@ -681,6 +1176,16 @@ class NetworkManager:
                     logger.debug(f"Error closing peer socket: {e}", event="disconnect")
                 self.peer_socket = None
         
+        # Stop the accept thread before closing the socket it waits on
+        accept_wake_writer = self._accept_wake_writer
+        if accept_wake_writer is not None:
+            self._accept_wake_writer = None
+            try:
+                accept_wake_writer.send(b'\0')
+            except OSError:
+                pass
+            accept_wake_writer.close()
+        
         # Close server socket if in server mode
         if self.socket and self.is_server:
             try:
@@ -698,6 +1203,10 @@ class NetworkManager:
         
         self.is_server = False
         logger.info("✓ Disconnected successfully", event="disconnect")
+        
+        # Notify UI
+        if was_connected:
+            self.on_disconnect()
     
     def get_peer_fingerprint(self):
         """
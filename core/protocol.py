@@ -3,12 +3,18 @@ Protocol definitions for P2P communication.
 Defines message types and handshake protocol.
 """
 
+import functools
 import json
 import struct
-import time
 from enum import IntEnum
 
 
+_LENGTH_STRUCT = struct.Struct('>I')
+_FRAME_HEADER_STRUCT = struct.Struct('>IB')
+# Frame header followed by the chunk sequence number
+_FILE_CHUNK_HEADER_STRUCT = struct.Struct('>IBI')
+
+
 class MessageType(IntEnum):
     """Protocol message types."""
     HELLO = 1
@@ -24,9 +30,35 @@ class MessageType(IntEnum):
     REKEY_REQUEST = 11
 
 
+# Plain int copies of per-message types for the hot encode paths; packing
+# an IntEnum member goes through __index__ and costs more than the pack
+_TEXT_MESSAGE = int(MessageType.TEXT_MESSAGE)
+_FILE_CHUNK = int(MessageType.FILE_CHUNK)
+
+
+# Fixed-size raw fields of the binary handshake payloads, in wire order.
+# Anything after the fixed fields is the message's trailing field.
+_HANDSHAKE_FIELDS = {
+    MessageType.HELLO: (('identity_key', 32), ('signing_key', 32), ('signature', 64)),
+    MessageType.HELLO_ACK: (('identity_key', 32), ('signing_key', 32), ('signature', 64),
+                            ('challenge', 32)),
+    MessageType.CHALLENGE_RESPONSE: (('response', 32), ('signature', 64)),
+}
+_HANDSHAKE_TRAILERS = {
+    MessageType.HELLO: 'cipher_suites',
+    MessageType.HELLO_ACK: 'cipher_suite',
+}
+
+
 class Protocol:
     """Handles protocol message encoding and decoding."""
     
+    # Size of the big-endian length prefix on every frame
+    HEADER_SIZE = 4
+    # Largest frame body a peer may announce; the receive buffer grows to
+    # the announced length, so anything larger is refused unread
+    MAX_MESSAGE_SIZE = 10 * 1024 * 1024
+    
     @staticmethod
     def encode_message(message_type, payload):
         """
@@ -49,14 +81,9 @@ class Protocol:
         else:
             payload_bytes = payload
         
-        # Build message
-        message_body = struct.pack('B', message_type) + payload_bytes
-        length = len(message_body)
-        
-        # Prepend length (4 bytes, big-endian)
-        message = struct.pack('>I', length) + message_body
-        
-        return message
+        # Length (type byte included) and type in one precompiled pack,
+        # so the payload is copied only once
+        return _FRAME_HEADER_STRUCT.pack(len(payload_bytes) + 1, message_type) + payload_bytes
     
     @staticmethod
     def decode_message(data):
@@ -69,72 +96,166 @@ class Protocol:
         Returns:
             tuple: (message_type, payload, remaining_data)
         """
-        if len(data) < 4:
+        decoded = Protocol.decode_next(data, 0)
+        if decoded is None:
             return None, None, data
+        message_type, payload, offset = decoded
+        return message_type, payload, data[offset:]
+    
+    @staticmethod
+    def decode_next(buffer, offset, limit=None):
+        """
+        Decode the next protocol message in place without slicing the buffer.
         
-        # Read length
-        length = struct.unpack('>I', data[:4])[0]
+        Args:
+            buffer: Receive buffer (bytes, bytearray or memoryview)
+            offset: Position of the length prefix within buffer
+            limit: End of valid data in buffer (defaults to its length)
+            
+        Returns:
+            tuple: (message_type, payload, new_offset), or None if no
+                complete message is available at offset
+            
+        Raises:
+            ValueError: If the frame at offset is empty or too large
+        """
+        if limit is None:
+            limit = len(buffer)
         
-        # Check if we have the full message
-        if len(data) < 4 + length:
-            return None, None, data
+        # Need the length prefix and type, then the whole frame
+        if limit - offset < 5:
+            return None
+        length, message_type = _FRAME_HEADER_STRUCT.unpack_from(buffer, offset)
+        if not length:
+            raise ValueError("Protocol frame without a message type")
+        if length > Protocol.MAX_MESSAGE_SIZE:
+            raise ValueError(f"Protocol frame of {length} bytes exceeds the size limit")
+        end = offset + 4 + length
+        if limit < end:
+            return None
+        
+        # Copy the payload out once, straight from the receive buffer;
+        # a caller-held memoryview saves wrapping the buffer per frame
+        if type(buffer) is memoryview:
+            with buffer[offset + 5:end] as payload_view:
+                payload_bytes = payload_view.tobytes()
+        else:
+            with memoryview(buffer) as view, view[offset + 5:end] as payload_view:
+                payload_bytes = payload_view.tobytes()
+        
+        # Binary payloads (text, file chunks, heartbeats) are returned as is
+        decoder = _PAYLOAD_DECODERS.get(message_type)
+        if decoder is None:
+            return message_type, payload_bytes, end
+        return message_type, decoder(payload_bytes), end
+    
+    @staticmethod
+    def _decode_handshake(message_type, payload_bytes):
+        """
+        Split a binary handshake payload into its raw fields.
         
-        # Extract message
-        message_data = data[4:4+length]
-        remaining = data[4+length:]
+        Args:
+            message_type: HELLO, HELLO_ACK or CHALLENGE_RESPONSE
+            payload_bytes: Payload after the type byte
+            
+        Returns:
+            dict: Field name to bytes (empty if the payload is truncated)
+        """
+        fields = {}
+        position = 0
+        for name, size in _HANDSHAKE_FIELDS[message_type]:
+            if len(payload_bytes) < position + size:
+                return {}
+            fields[name] = payload_bytes[position:position + size]
+            position += size
         
-        # Parse message type
-        message_type = message_data[0]
-        payload_bytes = message_data[1:]
+        trailer = _HANDSHAKE_TRAILERS.get(message_type)
+        if trailer:
+            fields[trailer] = payload_bytes[position:]
+        return fields
+    
+    @staticmethod
+    def _decode_json(payload_bytes):
+        """
+        Decode a JSON control payload.
         
-        # Try to decode as JSON
+        Args:
+            payload_bytes: Payload after the type byte
+            
+        Returns:
+            dict: Decoded payload, or the raw bytes if it is not valid JSON
+        """
         try:
-            payload = json.loads(payload_bytes.decode('utf-8'))
+            return json.loads(payload_bytes.decode('utf-8'))
         except (json.JSONDecodeError, UnicodeDecodeError):
-            payload = payload_bytes
+            return payload_bytes
+    
+    @staticmethod
+    def frame_end(buffer, offset, limit=None):
+        """
+        Get the buffer length needed to hold the frame starting at offset.
         
-        return message_type, payload, remaining
+        Args:
+            buffer: Receive buffer (bytes, bytearray or memoryview)
+            offset: Position of the length prefix within buffer
+            limit: End of valid data in buffer (defaults to its length)
+            
+        Returns:
+            int: End offset of the frame, or of its length prefix if that
+                is still incomplete
+            
+        Raises:
+            ValueError: If the frame is larger than MAX_MESSAGE_SIZE
+        """
+        if limit is None:
+            limit = len(buffer)
+        if limit - offset < 4:
+            return offset + 4
+        length = _LENGTH_STRUCT.unpack_from(buffer, offset)[0]
+        if length > Protocol.MAX_MESSAGE_SIZE:
+            raise ValueError(f"Protocol frame of {length} bytes exceeds the size limit")
+        return offset + 4 + length
     
     @staticmethod
-    def create_hello(identity_public_key, signing_public_key, signature):
+    def create_hello(identity_public_key, signing_public_key, signature, cipher_suites=()):
         """
         Create HELLO message for handshake.
         
+        Format: [IDENTITY_KEY:32][SIGNING_KEY:32][SIGNATURE:64][SUITE:1]*
+        
         Args:
             identity_public_key: X25519 public key bytes
             signing_public_key: Ed25519 public key bytes
             signature: Signature of identity key
+            cipher_suites: Supported AEAD cipher suites, most preferred first
             
         Returns:
             bytes: HELLO message
         """
-        payload = {
-            'identity_key': identity_public_key.hex(),
-            'signing_key': signing_public_key.hex(),
-            'signature': signature.hex()
-        }
+        payload = (identity_public_key + signing_public_key + signature +
+                   bytes(cipher_suites))
         return Protocol.encode_message(MessageType.HELLO, payload)
     
     @staticmethod
-    def create_hello_ack(identity_public_key, signing_public_key, signature, challenge):
+    def create_hello_ack(identity_public_key, signing_public_key, signature, challenge,
+                         cipher_suite):
         """
         Create HELLO_ACK message for handshake.
         
+        Format: [IDENTITY_KEY:32][SIGNING_KEY:32][SIGNATURE:64][CHALLENGE:32][SUITE:1]
+        
         Args:
             identity_public_key: X25519 public key bytes
             signing_public_key: Ed25519 public key bytes
             signature: Signature of identity key
             challenge: Random challenge for authentication
+            cipher_suite: AEAD cipher suite selected for the session
             
         Returns:
             bytes: HELLO_ACK message
         """
-        payload = {
-            'identity_key': identity_public_key.hex(),
-            'signing_key': signing_public_key.hex(),
-            'signature': signature.hex(),
-            'challenge': challenge.hex()
-        }
+        payload = (identity_public_key + signing_public_key + signature + challenge +
+                   bytes((cipher_suite,)))
         return Protocol.encode_message(MessageType.HELLO_ACK, payload)
     
     @staticmethod
@@ -142,6 +263,8 @@ class Protocol:
         """
         Create CHALLENGE_RESPONSE message.
         
+        Format: [RESPONSE:32][SIGNATURE:64]
+        
         Args:
             response: Challenge response bytes
             signature: Signature of response
@@ -149,10 +272,7 @@ class Protocol:
         Returns:
             bytes: CHALLENGE_RESPONSE message
         """
-        payload = {
-            'response': response.hex(),
-            'signature': signature.hex()
-        }
+        payload = response + signature
         return Protocol.encode_message(MessageType.CHALLENGE_RESPONSE, payload)
     
     @staticmethod
@@ -160,11 +280,12 @@ class Protocol:
         """
         Create READY message to complete handshake.
         
+        The message never changes, so it is encoded once at import.
+        
         Returns:
             bytes: READY message
         """
-        payload = {'status': 'ready'}
-        return Protocol.encode_message(MessageType.READY, payload)
+        return _READY_MESSAGE
     
     @staticmethod
     def create_text_message(encrypted_message):
@@ -177,7 +298,7 @@ class Protocol:
         Returns:
             bytes: TEXT_MESSAGE protocol message
         """
-        return Protocol.encode_message(MessageType.TEXT_MESSAGE, encrypted_message)
+        return Protocol.encode_message(_TEXT_MESSAGE, encrypted_message)
     
     @staticmethod
     def create_file_transfer(filename, file_size, file_hash):
@@ -211,26 +332,34 @@ class Protocol:
         Returns:
             bytes: FILE_CHUNK message
         """
-        # Chunk number as 4 bytes + encrypted data
-        payload = struct.pack('>I', chunk_number) + encrypted_chunk
-        return Protocol.encode_message(MessageType.FILE_CHUNK, payload)
+        # Frame header and chunk number packed together, so the chunk is
+        # copied once instead of once per concatenation
+        header = _FILE_CHUNK_HEADER_STRUCT.pack(
+            len(encrypted_chunk) + 5, _FILE_CHUNK, chunk_number
+        )
+        return header + encrypted_chunk
     
     @staticmethod
     def create_heartbeat():
         """
         Create HEARTBEAT message.
         
+        The frame carries no payload, so the same bytes are reused for
+        every heartbeat.
+        
         Returns:
             bytes: HEARTBEAT message
         """
-        payload = {'timestamp': struct.pack('>Q', int(time.time())).hex()}
-        return Protocol.encode_message(MessageType.HEARTBEAT, payload)
+        return _HEARTBEAT_MESSAGE
     
     @staticmethod
+    @functools.lru_cache(maxsize=16)
     def create_disconnect(reason="user_disconnect"):
         """
         Create DISCONNECT message.
         
+        Only a handful of reasons are used, so encoded messages are cached.
+        
         Args:
             reason: Reason for disconnection
             
@@ -239,3 +368,17 @@ class Protocol:
         """
         payload = {'reason': reason}
         return Protocol.encode_message(MessageType.DISCONNECT, payload)
+
+
+# Payload decoder for each message type that is not raw bytes
+_PAYLOAD_DECODERS = {
+    message_type: functools.partial(Protocol._decode_handshake, message_type)
+    for message_type in _HANDSHAKE_FIELDS
+}
+_PAYLOAD_DECODERS.update(dict.fromkeys(
+    (MessageType.READY, MessageType.FILE_TRANSFER, MessageType.DISCONNECT),
+    Protocol._decode_json
+))
+
+_HEARTBEAT_MESSAGE = Protocol.encode_message(MessageType.HEARTBEAT, b'')
+_READY_MESSAGE = Protocol.encode_message(MessageType.READY, {'status': 'ready'})
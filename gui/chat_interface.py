@@ -4,6 +4,7 @@ Chat interface components for displaying messages.
 
 import tkinter as tk
 from tkinter import ttk
+from collections import deque
 from datetime import datetime
 from gui.styles import COLORS, FONTS, ICONS
 from gui.widgets import MessageBubble
@@ -12,6 +13,12 @@ from gui.widgets import MessageBubble
 class ChatInterface:
     """Chat interface with message bubbles."""
     
+    # Bubbles kept on screen; older ones are destroyed and rebuilt from
+    # self.messages when the view is scrolled back to them
+    MAX_RENDERED_MESSAGES = 200
+    # Older messages rebuilt at a time when the view reaches the top
+    HISTORY_PAGE_SIZE = 50
+    
     def __init__(self, parent):
         """
         Initialize chat interface.
@@ -22,6 +29,17 @@ class ChatInterface:
         self.parent = parent
         self.messages = []
         
+        # Bubbles waiting to be built on the next idle tick, so a burst of
+        # messages costs one layout pass instead of one per message
+        self._pending_bubbles = []
+        self._flush_id = None
+        self._bubbles = deque()
+        self._history_id = None
+        
+        # Last formatted (hour, minute); chat bursts share the same label
+        self._time_key = None
+        self._time_str = ''
+        
         self._create_widgets()
     
     def _create_widgets(self):
@@ -51,19 +69,19 @@ class ChatInterface:
         display_frame.pack(fill=tk.BOTH, expand=True, padx=0, pady=0)
         
         # Scrollbar
-        scrollbar = ttk.Scrollbar(display_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.scrollbar = ttk.Scrollbar(display_frame)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         # Canvas for messages (allows better control over message bubbles)
         self.canvas = tk.Canvas(
             display_frame,
             bg=COLORS['background'],
-            yscrollcommand=scrollbar.set,
+            yscrollcommand=self._on_yview,
             highlightthickness=0
         )
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
-        scrollbar.config(command=self.canvas.yview)
+        self.scrollbar.config(command=self.canvas.yview)
         
         # Frame inside canvas for messages
         self.messages_frame = tk.Frame(self.canvas, bg=COLORS['background'])
@@ -140,12 +158,66 @@ class ChatInterface:
     
     def _on_frame_resize(self, event):
         """Handle frame resize."""
+        # Scrolling is left to whoever changed the content, so rebuilding
+        # older history does not jump back to the bottom
         self.canvas.configure(scrollregion=self.canvas.bbox('all'))
-        self._scroll_to_bottom()
+    
+    def _on_yview(self, first, last):
+        """
+        Update the scrollbar and rebuild older bubbles at the top.
+        
+        Args:
+            first: Top of the visible area, as a fraction of the content
+            last: Bottom of the visible area, as a fraction of the content
+        """
+        self.scrollbar.set(first, last)
+        if (float(first) <= 0.0 and self._history_id is None
+                and self._first_rendered() > 0):
+            self._history_id = self.canvas.after_idle(self._render_older)
+    
+    def _first_rendered(self):
+        """
+        Index in self.messages of the oldest message with a bubble.
+        
+        Returns:
+            int: Number of older messages that have no bubble
+        """
+        # Bubbles and pending bubbles always cover the newest messages
+        return len(self.messages) - len(self._pending_bubbles) - len(self._bubbles)
+    
+    def _render_older(self):
+        """Rebuild a page of older bubbles above the oldest one shown."""
+        self._history_id = None
+        first = self._first_rendered()
+        # A pending flush scrolls to the bottom anyway
+        if first <= 0 or self._pending_bubbles or not self._bubbles:
+            return
+        
+        # Keep the message at the top of the view where it is
+        old_height = self.messages_frame.winfo_height()
+        top = self.canvas.yview()[0] * old_height
+        
+        for text, direction, timestamp in reversed(
+                self.messages[max(0, first - self.HISTORY_PAGE_SIZE):first]):
+            bubble = MessageBubble(
+                self.messages_frame,
+                text=text,
+                direction=direction,
+                timestamp=timestamp.strftime('%H:%M')
+            )
+            bubble.pack(fill=tk.X, pady=2, before=self._bubbles[0])
+            self._bubbles.appendleft(bubble)
+        
+        self.canvas.update_idletasks()
+        self.canvas.configure(scrollregion=self.canvas.bbox('all'))
+        height = self.messages_frame.winfo_height()
+        if height > 0:
+            self.canvas.yview_moveto((height - old_height + top) / height)
     
     def _scroll_to_bottom(self):
         """Scroll to bottom of chat."""
         self.canvas.update_idletasks()
+        self.canvas.configure(scrollregion=self.canvas.bbox('all'))
         self.canvas.yview_moveto(1.0)
     
     def add_message(self, text, direction='sent', timestamp=None):
@@ -163,28 +235,59 @@ class ChatInterface:
             # Parse timestamp string if needed
             try:
                 timestamp = datetime.fromisoformat(timestamp)
-            except:
+            except ValueError:
                 timestamp = datetime.now()
         
-        # Format timestamp
-        time_str = timestamp.strftime('%H:%M')
-        
-        # Create message bubble using custom widget
-        bubble = MessageBubble(
-            self.messages_frame,
-            text=text,
-            direction=direction,
-            timestamp=time_str
-        )
-        bubble.pack(fill=tk.X, pady=2)
+        # Format timestamp, once per minute
+        time_key = (timestamp.hour, timestamp.minute)
+        if time_key != self._time_key:
+            self._time_key = time_key
+            self._time_str = timestamp.strftime('%H:%M')
+        time_str = self._time_str
         
         self.messages.append((text, direction, timestamp))
+        self._pending_bubbles.append((text, direction, time_str))
+        if self._flush_id is None:
+            self._flush_id = self.canvas.after_idle(self._flush_bubbles)
+    
+    def _flush_bubbles(self):
+        """Build all pending message bubbles and scroll once."""
+        self._flush_id = None
+        # Bubbles that would be trimmed right away are never built
+        pending = self._pending_bubbles[-self.MAX_RENDERED_MESSAGES:]
+        self._pending_bubbles = []
+        
+        for text, direction, time_str in pending:
+            # Create message bubble using custom widget
+            bubble = MessageBubble(
+                self.messages_frame,
+                text=text,
+                direction=direction,
+                timestamp=time_str
+            )
+            bubble.pack(fill=tk.X, pady=2)
+            self._bubbles.append(bubble)
+        
+        # Keep widget count, and so geometry work, bounded in long sessions;
+        # _render_older rebuilds trimmed bubbles when scrolled back to
+        while len(self._bubbles) > self.MAX_RENDERED_MESSAGES:
+            self._bubbles.popleft().destroy()
+        
         self._scroll_to_bottom()
     
     def clear_messages(self):
         """Clear all messages from display."""
+        if self._flush_id is not None:
+            self.canvas.after_cancel(self._flush_id)
+            self._flush_id = None
+        if self._history_id is not None:
+            self.canvas.after_cancel(self._history_id)
+            self._history_id = None
+        self._pending_bubbles.clear()
+        
         for widget in self.messages_frame.winfo_children():
             widget.destroy()
+        self._bubbles.clear()
         self.messages.clear()
     
     def get_input_text(self):
@@ -3,6 +3,7 @@ Connection dialog for the P2P messenger.
 Allows user to choose between server and client mode.
 """
 
+import concurrent.futures
 import tkinter as tk
 from tkinter import ttk, messagebox
 from utils.validators import validate_ip, validate_port
@@ -12,6 +13,12 @@ from gui.styles import COLORS, FONTS, ICONS
 class ConnectionDialog:
     """Dialog for establishing P2P connections."""
     
+    # mode_var values; an IntVar avoids marshalling strings through Tcl
+    MODE_LISTEN = 0
+    MODE_CONNECT = 1
+    # Quiet period after an edit before the inputs are re-validated
+    VALIDATE_DELAY_MS = 150
+    
     def __init__(self, parent, key_manager):
         """
         Initialize connection dialog.
@@ -24,29 +31,72 @@ class ConnectionDialog:
         self.key_manager = key_manager
         self.result = None
         
-        self.dialog = tk.Toplevel(parent)
+        # The window is built by show(), so an unshown dialog costs nothing,
+        # then hidden rather than destroyed so later shows reuse it
+        self.dialog = None
+        self._closed = None
+        self._future = None
+        
+        # Input validation runs while typing; submit only reads the outcome
+        self._validate_id = None
+        self._input_error = None
+    
+    def _build(self):
+        """Create the dialog window and its widgets."""
+        self.dialog = tk.Toplevel(self.parent)
+        # Kept unmapped while it is filled in, so it is drawn once, complete
+        self.dialog.withdraw()
         self.dialog.title(f"{ICONS['connect']} Connexion P2P")
-        self.dialog.geometry("500x450")
+        
+        # Centered on screen in one geometry call; the screen size is known
+        # from the parent, so no idle flush is needed to measure anything
+        x = (self.parent.winfo_screenwidth() // 2) - (500 // 2)
+        y = (self.parent.winfo_screenheight() // 2) - (450 // 2)
+        self.dialog.geometry(f"500x450+{x}+{y}")
         self.dialog.resizable(False, False)
-        self.dialog.transient(parent)
-        self.dialog.grab_set()
         self.dialog.configure(bg=COLORS['background'])
         
         self._create_widgets()
         
-        # Bind Escape key
+        # Bind Escape key; the close button cancels instead of destroying
         self.dialog.bind('<Escape>', lambda e: self._on_cancel())
+        self.dialog.protocol('WM_DELETE_WINDOW', self._on_cancel)
         
-        # Center dialog
-        self.dialog.update_idletasks()
-        x = (self.dialog.winfo_screenwidth() // 2) - (500 // 2)
-        y = (self.dialog.winfo_screenheight() // 2) - (450 // 2)
-        self.dialog.geometry(f"500x450+{x}+{y}")
+        # show() waits on this; also released if the parent goes away
+        self._closed = tk.BooleanVar(self.dialog, value=False)
+        self.dialog.bind('<Destroy>', self._on_destroy)
+        
+        # Shown and made modal last, once the widget tree is complete
+        self.dialog.transient(self.parent)
+        self.dialog.deiconify()
+        self.dialog.grab_set()
     
     def _create_widgets(self):
         """Create dialog widgets."""
+        # Style values shared by most widgets below
+        bg = COLORS['background']
+        card_bg = COLORS['secondary']
+        fg = COLORS['text_primary']
+        body_font = FONTS['body']
+        
+        # Options repeated across widgets of the same kind, kept in one place
+        # (ttk styles can't express the colored radio cards portably)
+        radio_options = dict(
+            font=body_font,
+            bg=card_bg,
+            fg=fg,
+            selectcolor=card_bg,
+            activebackground=card_bg,
+            pady=17,
+            padx=12,
+            bd=0,
+            cursor='hand2'
+        )
+        field_label_options = dict(width=12, font=body_font, fg=fg, bg=bg, anchor=tk.W)
+        entry_options = dict(font=body_font, bg=bg, fg=fg, relief=tk.SOLID, bd=1)
+        
         # Main frame
-        main_frame = tk.Frame(self.dialog, bg=COLORS['background'])
+        main_frame = tk.Frame(self.dialog, bg=bg)
         main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
         
         # Title
@@ -54,8 +104,8 @@ class ConnectionDialog:
             main_frame,
             text=f"{ICONS['connect']} Établir une connexion sécurisée",
             font=FONTS['title'],
-            fg=COLORS['text_primary'],
-            bg=COLORS['background']
+            fg=fg,
+            bg=bg
         )
         title_label.pack(pady=(0, 20))
         
@@ -64,181 +114,125 @@ class ConnectionDialog:
             main_frame,
             text="Mode de connexion:",
             font=FONTS['heading'],
-            fg=COLORS['text_primary'],
-            bg=COLORS['background'],
+            fg=fg,
+            bg=bg,
             anchor=tk.W
         )
         mode_label.pack(fill=tk.X, pady=(0, 10))
         
-        mode_frame = tk.Frame(main_frame, bg=COLORS['background'])
+        mode_frame = tk.Frame(main_frame, bg=bg)
         mode_frame.pack(fill=tk.X, pady=(0, 15))
         
-        self.mode_var = tk.StringVar(value="listen")
-        
-        # Listen mode card
-        listen_card = tk.Frame(mode_frame, bg=COLORS['secondary'], relief=tk.FLAT, bd=2)
-        listen_card.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
+        self.mode_var = tk.IntVar(value=self.MODE_LISTEN)
+        # Mode the IP field was last configured for; re-clicks are no-ops
+        self._last_mode = None
         
+        # Mode cards: each radio button is its own card
         listen_radio = tk.Radiobutton(
-            listen_card,
+            mode_frame,
             text=f"{ICONS['listen']} Écouter\n(Serveur)",
             variable=self.mode_var,
-            value="listen",
+            value=self.MODE_LISTEN,
             command=self._on_mode_change,
-            font=FONTS['body'],
-            bg=COLORS['secondary'],
-            fg=COLORS['text_primary'],
-            selectcolor=COLORS['secondary'],
-            activebackground=COLORS['secondary'],
-            pady=15,
-            padx=10,
-            bd=0,
-            cursor='hand2'
+            **radio_options
         )
-        listen_radio.pack(fill=tk.BOTH, expand=True)
-        
-        # Connect mode card
-        connect_card = tk.Frame(mode_frame, bg=COLORS['secondary'], relief=tk.FLAT, bd=2)
-        connect_card.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(5, 0))
+        listen_radio.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 5))
         
         connect_radio = tk.Radiobutton(
-            connect_card,
+            mode_frame,
             text=f"{ICONS['connect']} Se connecter\n(Client)",
             variable=self.mode_var,
-            value="connect",
+            value=self.MODE_CONNECT,
             command=self._on_mode_change,
-            font=FONTS['body'],
-            bg=COLORS['secondary'],
-            fg=COLORS['text_primary'],
-            selectcolor=COLORS['secondary'],
-            activebackground=COLORS['secondary'],
-            pady=15,
-            padx=10,
-            bd=0,
-            cursor='hand2'
+            **radio_options
         )
-        connect_radio.pack(fill=tk.BOTH, expand=True)
+        connect_radio.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(5, 0))
         
         # Connection details
         details_frame = tk.LabelFrame(
             main_frame,
             text=" Paramètres ",
-            font=FONTS['body'],
-            fg=COLORS['text_primary'],
-            bg=COLORS['background'],
+            font=body_font,
+            fg=fg,
+            bg=bg,
             relief=tk.SOLID,
             bd=1
         )
         details_frame.pack(fill=tk.X, pady=(0, 15))
-        
-        inner_frame = tk.Frame(details_frame, bg=COLORS['background'])
-        inner_frame.pack(fill=tk.BOTH, expand=True, padx=15, pady=15)
+        # Labels and entries share one grid; the entry column stretches
+        details_frame.columnconfigure(1, weight=1)
         
         # IP Address (only for client mode)
-        ip_frame = tk.Frame(inner_frame, bg=COLORS['background'])
-        ip_frame.pack(fill=tk.X, pady=(0, 10))
-        
         self.ip_label = tk.Label(
-            ip_frame,
+            details_frame,
             text="Adresse IP:",
-            width=12,
-            font=FONTS['body'],
-            fg=COLORS['text_primary'],
-            bg=COLORS['background'],
-            anchor=tk.W
+            **field_label_options
         )
-        self.ip_label.pack(side=tk.LEFT, padx=(0, 10))
+        self.ip_label.grid(row=0, column=0, sticky=tk.W, padx=(15, 10), pady=(15, 10))
         
-        self.ip_entry = tk.Entry(
-            ip_frame,
-            font=FONTS['body'],
-            bg=COLORS['background'],
-            fg=COLORS['text_primary'],
-            relief=tk.SOLID,
-            bd=1
-        )
-        self.ip_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.ip_entry = tk.Entry(details_frame, **entry_options)
+        self.ip_entry.grid(row=0, column=1, sticky=tk.EW, padx=(0, 15), pady=(15, 10))
         self.ip_entry.insert(0, "127.0.0.1")
         
         # Port
-        port_frame = tk.Frame(inner_frame, bg=COLORS['background'])
-        port_frame.pack(fill=tk.X)
-        
         tk.Label(
-            port_frame,
+            details_frame,
             text="Port:",
-            width=12,
-            font=FONTS['body'],
-            fg=COLORS['text_primary'],
-            bg=COLORS['background'],
-            anchor=tk.W
-        ).pack(side=tk.LEFT, padx=(0, 10))
+            **field_label_options
+        ).grid(row=1, column=0, sticky=tk.W, padx=(15, 10), pady=(0, 15))
         
-        self.port_entry = tk.Entry(
-            port_frame,
-            font=FONTS['body'],
-            bg=COLORS['background'],
-            fg=COLORS['text_primary'],
-            relief=tk.SOLID,
-            bd=1
-        )
-        self.port_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.port_entry = tk.Entry(details_frame, **entry_options)
+        self.port_entry.grid(row=1, column=1, sticky=tk.EW, padx=(0, 15), pady=(0, 15))
         self.port_entry.insert(0, "5555")
         
         # Fingerprint display
         fp_frame = tk.LabelFrame(
             main_frame,
             text=" Votre identité ",
-            font=FONTS['body'],
-            fg=COLORS['text_primary'],
-            bg=COLORS['background'],
+            font=body_font,
+            fg=fg,
+            bg=bg,
             relief=tk.SOLID,
             bd=1
         )
         fp_frame.pack(fill=tk.BOTH, expand=True, pady=(0, 15))
         
-        fp_inner = tk.Frame(fp_frame, bg=COLORS['background'])
-        fp_inner.pack(fill=tk.BOTH, expand=True, padx=15, pady=15)
-        
         tk.Label(
-            fp_inner,
+            fp_frame,
             text="Fingerprint:",
-            font=FONTS['body'],
-            fg=COLORS['text_primary'],
-            bg=COLORS['background'],
+            font=body_font,
+            fg=fg,
+            bg=bg,
             anchor=tk.W
-        ).pack(fill=tk.X, pady=(0, 5))
+        ).pack(fill=tk.X, padx=15, pady=(15, 5))
         
         fingerprint = self.key_manager.get_fingerprint()
         
-        fp_display_frame = tk.Frame(fp_inner, bg=COLORS['secondary'], relief=tk.FLAT, bd=1)
-        fp_display_frame.pack(fill=tk.BOTH, expand=True)
-        
-        fp_text = tk.Text(
-            fp_display_frame,
-            height=2,
-            wrap=tk.WORD,
+        # Static text: a Label, without a Text widget's undo stack and tags
+        tk.Label(
+            fp_frame,
+            text=fingerprint,
+            wraplength=410,
+            justify=tk.LEFT,
+            anchor=tk.W,
             font=FONTS['mono_small'],
-            bg=COLORS['secondary'],
-            fg=COLORS['text_primary'],
-            relief=tk.FLAT,
-            bd=8
-        )
-        fp_text.insert(1.0, fingerprint)
-        fp_text.config(state=tk.DISABLED)
-        fp_text.pack(fill=tk.BOTH, expand=True)
+            bg=card_bg,
+            fg=fg,
+            padx=9,
+            pady=9
+        ).pack(fill=tk.BOTH, expand=True, padx=15, pady=(0, 15))
         
         # Buttons
-        button_frame = tk.Frame(main_frame, bg=COLORS['background'])
+        button_frame = tk.Frame(main_frame, bg=bg)
         button_frame.pack(fill=tk.X)
         
         cancel_btn = tk.Button(
             button_frame,
             text="Annuler",
             command=self._on_cancel,
-            font=FONTS['body'],
-            bg=COLORS['secondary'],
-            fg=COLORS['text_primary'],
+            font=body_font,
+            bg=card_bg,
+            fg=fg,
             relief=tk.FLAT,
             bd=0,
             padx=20,
@@ -251,7 +245,7 @@ class ConnectionDialog:
             button_frame,
             text=f"Connecter {ICONS['rocket']}",
             command=self._on_connect,
-            font=FONTS['body'],
+            font=body_font,
             bg=COLORS['primary'],
             fg='white',
             relief=tk.FLAT,
@@ -262,48 +256,136 @@ class ConnectionDialog:
         )
         connect_btn.pack(side=tk.RIGHT)
         
+        # Traces see every edit (typing, paste, _reset), unlike key bindings;
+        # the variables are kept on self so Tk doesn't lose them to GC
+        self._ip_var = tk.StringVar(self.dialog, value=self.ip_entry.get())
+        self._port_var = tk.StringVar(self.dialog, value=self.port_entry.get())
+        self.ip_entry.config(textvariable=self._ip_var)
+        self.port_entry.config(textvariable=self._port_var)
+        self._ip_var.trace_add('write', self._schedule_validate)
+        self._port_var.trace_add('write', self._schedule_validate)
+        
         # Initial state
         self._on_mode_change()
     
     def _on_mode_change(self):
         """Handle mode change."""
-        if self.mode_var.get() == "listen":
+        mode = self.mode_var.get()
+        if mode == self._last_mode:
+            return
+        self._last_mode = mode
+        
+        if mode == self.MODE_LISTEN:
             self.ip_entry.config(state=tk.DISABLED)
             self.ip_label.config(state=tk.DISABLED)
         else:
             self.ip_entry.config(state=tk.NORMAL)
             self.ip_label.config(state=tk.NORMAL)
+        
+        # The IP address only matters in connect mode
+        self._validate_now()
+    
+    def _schedule_validate(self, *args):
+        """Re-validate the inputs once typing pauses."""
+        if self._validate_id is not None:
+            self.dialog.after_cancel(self._validate_id)
+        self._validate_id = self.dialog.after(self.VALIDATE_DELAY_MS, self._validate_now)
+    
+    def _validate_now(self):
+        """Validate the inputs and remember the first error, if any."""
+        if self._validate_id is not None:
+            self.dialog.after_cancel(self._validate_id)
+            self._validate_id = None
+        
+        if not validate_port(self.port_entry.get().strip()):
+            self._input_error = "Please enter a valid port (1-65535)"
+        elif (self.mode_var.get() == self.MODE_CONNECT and
+              not validate_ip(self.ip_entry.get().strip())):
+            self._input_error = "Please enter a valid IP address"
+        else:
+            self._input_error = None
     
     def _on_connect(self):
         """Handle connect button."""
-        mode = self.mode_var.get()
-        port = self.port_entry.get().strip()
+        # Catch up if the last keystroke is still inside the debounce delay
+        if self._validate_id is not None:
+            self._validate_now()
         
-        # Validate port
-        if not validate_port(port):
-            messagebox.showerror("Invalid Input", "Please enter a valid port (1-65535)")
+        if self._input_error:
+            messagebox.showerror("Invalid Input", self._input_error)
             return
         
-        port = int(port)
+        port = int(self.port_entry.get().strip())
         
-        if mode == "connect":
+        if self.mode_var.get() == self.MODE_CONNECT:
             ip = self.ip_entry.get().strip()
-            
-            # Validate IP
-            if not validate_ip(ip):
-                messagebox.showerror("Invalid Input", "Please enter a valid IP address")
-                return
-            
             self.result = {"mode": "connect", "host": ip, "port": port}
         else:
             self.result = {"mode": "listen", "port": port}
         
-        self.dialog.destroy()
+        self._close()
     
     def _on_cancel(self):
         """Handle cancel button."""
         self.result = None
-        self.dialog.destroy()
+        self._close()
+    
+    def _close(self):
+        """Hide the dialog for reuse and release show()."""
+        self.dialog.grab_release()
+        self.dialog.withdraw()
+        self._finish()
+    
+    def _on_destroy(self, event):
+        """Release show() if the window is destroyed while open."""
+        if event.widget is self.dialog:
+            if self._validate_id is not None:
+                self.dialog.after_cancel(self._validate_id)
+                self._validate_id = None
+            self._finish()
+    
+    def _finish(self):
+        """Resolve the pending show with the current result."""
+        future = self._future
+        self._future = None
+        if future is not None:
+            future.set_result(self.result)
+        self._closed.set(True)
+    
+    def _reset(self):
+        """Restore default inputs before the dialog is shown again."""
+        self.result = None
+        self.mode_var.set(self.MODE_LISTEN)
+        self.ip_entry.config(state=tk.NORMAL)
+        self.ip_entry.delete(0, tk.END)
+        self.ip_entry.insert(0, "127.0.0.1")
+        self.port_entry.delete(0, tk.END)
+        self.port_entry.insert(0, "5555")
+        self._last_mode = None
+        self._on_mode_change()
+    
+    def show_async(self):
+        """
+        Show dialog without waiting for it to close.
+        
+        Lets the caller keep working (or keep the event loop running) while
+        the user fills in the dialog. The future is resolved on the Tk
+        thread, so done callbacks that touch widgets are safe.
+        
+        Returns:
+            concurrent.futures.Future: Resolves to the connection details,
+                or None if cancelled
+        """
+        if self.dialog is None or not self.dialog.winfo_exists():
+            self._build()
+        else:
+            self._reset()
+            self.dialog.deiconify()
+            self.dialog.grab_set()
+        
+        self._future = concurrent.futures.Future()
+        self._closed.set(False)
+        return self._future
     
     def show(self):
         """
@@ -312,5 +394,6 @@ class ConnectionDialog:
         Returns:
             dict: Connection details or None if cancelled
         """
-        self.dialog.wait_window()
-        return self.result
+        future = self.show_async()
+        self.dialog.wait_variable(self._closed)
+        return future.result()
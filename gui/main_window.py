@@ -25,6 +25,9 @@ class MainWindow:
         """
         self.app = app
         self.root = tk.Tk()
+        
+        # Built on first use and reused, hidden between connections
+        self._connection_dialog = None
         self.root.title(f"{ICONS['lock']} Secure P2P Messenger")
         
         # Get window size from config or use defaults
@@ -222,8 +225,9 @@ class MainWindow:
         from gui.connection_dialog import ConnectionDialog
         
         # ✅ Passer key_manager à ConnectionDialog
-        dialog = ConnectionDialog(self.root, self.app.key_manager)
-        result = dialog.show()
+        if self._connection_dialog is None:
+            self._connection_dialog = ConnectionDialog(self.root, self.app.key_manager)
+        result = self._connection_dialog.show()
         
         if result:
             mode = result.get('mode')
@@ -140,6 +140,9 @@ class SecureMessengerApp:
             )
             
             logger.info("New keys generated", event="key_generation")
+        
+        # Nothing saves the keys again this session; wipe the derived key
+        self.key_manager.clear_key_cache()
     
     def _initialize_storage(self):
         """Initialize database storage."""
@@ -183,7 +186,7 @@ class SecureMessengerApp:
             )
             self._setup_network_callbacks()
         
-        success = self.network_manager.start_server(port=port)
+        success = self.network_manager.start_server(port=port, **self._socket_buffer_options())
         
         if success:
             self.main_window.update_status(
@@ -226,7 +229,9 @@ class SecureMessengerApp:
             )
             self._setup_network_callbacks()
         
-        success = self.network_manager.connect_to_peer(host, port)  # ✅ Correct
+        success = self.network_manager.connect_to_peer(
+            host, port, **self._socket_buffer_options()
+        )
         
         if success:
             self.main_window.update_status(
@@ -242,6 +247,18 @@ class SecureMessengerApp:
                 f"Check your network connection and firewall settings."
             )
     
+    def _socket_buffer_options(self):
+        """
+        Get socket buffer sizes from configuration.
+        
+        Returns:
+            dict: rcvbuf/sndbuf keyword arguments (None keeps kernel autotuning)
+        """
+        return {
+            'rcvbuf': self.config.get('network', 'socket_rcvbuf') or None,
+            'sndbuf': self.config.get('network', 'socket_sndbuf') or None
+        }
+    
     def _setup_network_callbacks(self):
         """Setup callbacks for network events."""
         self.network_manager.register_callback(
@@ -253,6 +270,11 @@ class SecureMessengerApp:
             'text_message',
             self._on_text_message
         )
+        
+        self.network_manager.register_callback(
+            'disconnect',
+            self._on_disconnect
+        )
     
     def _on_handshake_complete(self):
         """Handle handshake completion."""
@@ -295,6 +317,18 @@ class SecureMessengerApp:
         logger.info("Message received", event="message_received")
         self.main_window.display_received_message(message_text)
     
+    def _on_disconnect(self):
+        """Handle the end of a connection, including one the peer dropped."""
+        logger.info("Connection closed", event="disconnect")
+        
+        # May run on the network thread; Tk must be updated from its own
+        self.main_window.root.after(0, self._show_disconnected)
+    
+    def _show_disconnected(self):
+        """Reflect a closed connection in the UI."""
+        self.main_window.update_status("Déconnecté")
+        self.main_window.enable_chat(False)
+    
     def shutdown(self):
         """Shutdown application."""
         logger.info("Shutting down application", event="app_shutdown")
@@ -309,6 +343,7 @@ class SecureMessengerApp:
         
         # Clear crypto manager
         self.crypto_manager.clear_session()
+        self.key_manager.clear_key_cache()
     
     def run(self):
         """Run the application."""
@@ -5,6 +5,7 @@ Uses SQLite with encryption for sensitive data.
 
 import sqlite3
 import os
+import threading
 from datetime import datetime
 from pathlib import Path
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
@@ -19,6 +20,10 @@ logger = SecureLogger('database_manager')
 class DatabaseManager:
     """Manages SQLite database for message storage."""
     
+    # Random bytes drawn from the OS per refill of the nonce pool
+    NONCE_POOL_SIZE = 4096
+    NONCE_SIZE = 12
+    
     def __init__(self, db_path='data/database/messenger.db', password=None):
         """
         Initialize database manager.
@@ -47,6 +52,11 @@ class DatabaseManager:
             self.encryption_key = None
             self.cipher = None
         
+        # Pool of CSPRNG output sliced into per-record nonces
+        self._nonce_pool = b''
+        self._nonce_pool_offset = 0
+        self._nonce_lock = threading.Lock()
+        
         self.conn = None
         self._connect()
         self._create_tables()
@@ -155,6 +165,24 @@ class DatabaseManager:
         self.conn.commit()
         logger.info("Database tables created", event="db_init")
     
+    def _generate_nonce(self):
+        """
+        Generate a random nonce for record encryption.
+        
+        Nonces are sliced from a pool refilled with os.urandom, so one
+        getrandom call covers hundreds of records.
+        
+        Returns:
+            bytes: 12-byte nonce
+        """
+        with self._nonce_lock:
+            offset = self._nonce_pool_offset
+            if offset + self.NONCE_SIZE > len(self._nonce_pool):
+                self._nonce_pool = os.urandom(self.NONCE_POOL_SIZE)
+                offset = 0
+            self._nonce_pool_offset = offset + self.NONCE_SIZE
+            return self._nonce_pool[offset:offset + self.NONCE_SIZE]
+    
     def _encrypt_content(self, content):
         """
         Encrypt content for storage.
@@ -174,7 +202,7 @@ class DatabaseManager:
         if isinstance(content, str):
             content = content.encode('utf-8')
         
-        nonce = secrets.token_bytes(12)
+        nonce = self._generate_nonce()
         encrypted = self.cipher.encrypt(nonce, content, None)
         return encrypted, nonce
     
@@ -4,8 +4,11 @@ Unit tests for cryptographic functions.
 
 import unittest
 import secrets
+import struct
+import time
 from core.key_manager import KeyManager
 from core.crypto_manager import CryptoManager
+from core.message_handler import MessageHandler
 
 
 class TestCrypto(unittest.TestCase):
@@ -89,6 +92,31 @@ class TestCrypto(unittest.TestCase):
         is_valid = self.key_manager.verify_signature(wrong_data, signature, public_key)
         self.assertFalse(is_valid)
     
+    def test_fingerprint_format(self):
+        """Test fingerprint is the colon-separated SHA-256 of the signing key."""
+        import hashlib
+        self.key_manager.generate_signing_keys()
+        
+        fingerprint = self.key_manager.get_fingerprint()
+        expected = hashlib.sha256(self.key_manager.get_signing_public_bytes()).hexdigest()
+        
+        self.assertEqual(fingerprint.replace(':', ''), expected)
+        self.assertEqual(len(fingerprint.split(':')), 32)
+    
+    def test_batch_signature_verification(self):
+        """Test batch verification reports each signature individually."""
+        self.key_manager.generate_signing_keys()
+        public_key = self.key_manager.get_signing_public_bytes()
+        
+        items = []
+        for i in range(5):
+            data = f"message {i}".encode()
+            items.append((data, self.key_manager.sign_data(data), public_key))
+        items.append((b"tampered", items[0][1], public_key))
+        
+        results = self.key_manager.verify_signatures_batch(items)
+        self.assertEqual(results, [True] * 5 + [False])
+    
     def test_nonce_uniqueness(self):
         """Test that nonces are unique."""
         session_key = secrets.token_bytes(32)
@@ -100,6 +128,215 @@ class TestCrypto(unittest.TestCase):
             self.assertNotIn(nonce, nonces)
             nonces.add(nonce)
     
+    def test_cipher_suite_selection(self):
+        """Test AES-GCM is only chosen when both peers prefer it."""
+        local = CryptoManager.supported_suites()
+        self.assertEqual(set(local), {CryptoManager.SUITE_AES_256_GCM,
+                                      CryptoManager.SUITE_CHACHA20_POLY1305})
+        
+        self.assertEqual(CryptoManager.select_suite(local), local[0])
+        self.assertEqual(CryptoManager.select_suite(list(reversed(local))),
+                         CryptoManager.SUITE_CHACHA20_POLY1305)
+        self.assertEqual(CryptoManager.select_suite(None),
+                         CryptoManager.SUITE_CHACHA20_POLY1305)
+    
+    def test_aes_gcm_suite_round_trip(self):
+        """Test encryption and decryption with the AES-256-GCM suite."""
+        self.crypto_manager.set_session_key(secrets.token_bytes(32),
+                                            CryptoManager.SUITE_AES_256_GCM)
+        
+        encrypted = self.crypto_manager.encrypt_message("over AES", sender_id=b"self")
+        plaintext, _, _ = self.crypto_manager.decrypt_message(encrypted, sender_id=b"self")
+        self.assertEqual(plaintext, b"over AES")
+        
+        with self.assertRaises(ValueError):
+            self.crypto_manager.set_session_key(secrets.token_bytes(32), 99)
+    
+    def test_replay_rejected(self):
+        """Test that replayed and out-of-window messages are rejected."""
+        session_key = secrets.token_bytes(32)
+        self.crypto_manager.set_session_key(session_key)
+
+        first = self.crypto_manager.encrypt_message("first", sender_id=b"self")
+        second = self.crypto_manager.encrypt_message("second", sender_id=b"self")
+
+        # Out-of-order delivery inside the window is accepted
+        self.crypto_manager.decrypt_message(second, sender_id=b"self")
+        self.crypto_manager.decrypt_message(first, sender_id=b"self")
+
+        # Replays are rejected
+        with self.assertRaises(ValueError):
+            self.crypto_manager.decrypt_message(first, sender_id=b"self")
+
+        # Messages older than the window are rejected
+        stale = self.crypto_manager.encrypt_message("stale", sender_id=b"self")
+        for _ in range(CryptoManager.REPLAY_WINDOW_SIZE):
+            self.crypto_manager.generate_nonce()
+        latest = self.crypto_manager.encrypt_message("latest", sender_id=b"self")
+        self.crypto_manager.decrypt_message(latest, sender_id=b"self")
+        with self.assertRaises(ValueError):
+            self.crypto_manager.decrypt_message(stale, sender_id=b"self")
+
+    def test_stale_or_tampered_timestamp_rejected(self):
+        """Test that the in-band timestamp is checked and authenticated."""
+        session_key = secrets.token_bytes(32)
+        self.crypto_manager.set_session_key(session_key)
+
+        encrypted = self.crypto_manager.encrypt_message("hello", sender_id=b"self")
+
+        # Timestamp outside the freshness window
+        stale = bytearray(encrypted)
+        stale[2:10] = struct.pack('>Q', int(time.time()) - 3600)
+        with self.assertRaises(ValueError):
+            self.crypto_manager.decrypt_message(bytes(stale), sender_id=b"self")
+
+        # Timestamp inside the window but not the one that was authenticated
+        shifted = bytearray(encrypted)
+        shifted[2:10] = struct.pack('>Q', struct.unpack('>Q', encrypted[2:10])[0] - 1)
+        with self.assertRaises(ValueError):
+            self.crypto_manager.decrypt_message(bytes(shifted), sender_id=b"self")
+
+        # The untouched message still decrypts
+        plaintext, _, _ = self.crypto_manager.decrypt_message(encrypted, sender_id=b"self")
+        self.assertEqual(plaintext, b"hello")
+
+    def test_file_stream_round_trip(self):
+        """Test streamed file chunks match the per-chunk format."""
+        session_key = secrets.token_bytes(32)
+        self.crypto_manager.set_session_key(session_key)
+        
+        chunks = [secrets.token_bytes(1024) for _ in range(4)]
+        encrypted = list(self.crypto_manager.encrypt_file_stream(chunks))
+        
+        # Each streamed chunk can be decrypted on its own
+        self.assertEqual(self.crypto_manager.decrypt_file_chunk(encrypted[0], 0), chunks[0])
+        
+        # Chunks are bound to their sequence number
+        with self.assertRaises(ValueError):
+            self.crypto_manager.decrypt_file_chunk(encrypted[2], 1)
+        
+        decrypted = list(self.crypto_manager.decrypt_file_stream(encrypted[1:], 1))
+        self.assertEqual(decrypted, chunks[1:])
+    
+    def test_key_storage_reuses_argon2_output(self):
+        """Test that saving after loading with the same password skips Argon2id."""
+        import tempfile
+        import shutil
+        from unittest.mock import patch
+        from core import key_manager as key_manager_module
+        
+        keys_dir = tempfile.mkdtemp()
+        try:
+            manager = KeyManager(keys_dir)
+            manager.generate_identity_keys()
+            manager.generate_signing_keys()
+            
+            with patch.object(key_manager_module, 'hash_secret_raw',
+                              wraps=key_manager_module.hash_secret_raw) as kdf:
+                manager.save_keys('correct horse')
+                self.assertTrue(manager.load_keys('correct horse'))
+                manager.save_keys('correct horse')
+                self.assertEqual(kdf.call_count, 1)
+                
+                # A different password still derives a fresh key
+                self.assertFalse(manager.load_keys('wrong password'))
+                self.assertEqual(kdf.call_count, 2)
+                
+                # Clearing wipes the cached keys, so the next save derives again
+                cached = list(manager._argon2_cache.values())
+                manager.clear_key_cache()
+                self.assertEqual(manager._argon2_cache, {})
+                self.assertTrue(all(key == bytearray(32) for key in cached))
+                manager.save_keys('correct horse')
+                self.assertEqual(kdf.call_count, 3)
+            
+            reloaded = KeyManager(keys_dir)
+            self.assertTrue(reloaded.load_keys('correct horse'))
+            self.assertEqual(reloaded.get_fingerprint(), manager.get_fingerprint())
+        finally:
+            shutil.rmtree(keys_dir)
+    
+    def test_load_legacy_key_files(self):
+        """Test that key files written without a parameter header still load."""
+        import os
+        import tempfile
+        import shutil
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+        from argon2.low_level import hash_secret_raw, Type
+        
+        keys_dir = tempfile.mkdtemp()
+        try:
+            manager = KeyManager(keys_dir)
+            manager.generate_identity_keys()
+            manager.generate_signing_keys()
+            
+            # Write key files the way older versions did
+            salt = secrets.token_bytes(32)
+            time_cost, memory_cost, parallelism = KeyManager.LEGACY_ARGON2_PARAMS
+            encryption_key = hash_secret_raw(
+                secret=b'legacy', salt=salt, time_cost=time_cost,
+                memory_cost=memory_cost, parallelism=parallelism,
+                hash_len=32, type=Type.ID
+            )
+            raw = serialization.Encoding.Raw, serialization.PrivateFormat.Raw, serialization.NoEncryption()
+            for name, key in (('identity.key', manager.identity_private),
+                              ('signing.key', manager.signing_private)):
+                encrypted = manager._encrypt_key(key.private_bytes(*raw), ChaCha20Poly1305(encryption_key))
+                with open(os.path.join(keys_dir, name), 'wb') as f:
+                    f.write(salt + encrypted)
+            
+            reloaded = KeyManager(keys_dir)
+            self.assertTrue(reloaded.load_keys('legacy'))
+            self.assertEqual(reloaded.get_fingerprint(), manager.get_fingerprint())
+            
+            # Saving again upgrades to the current header format
+            reloaded.save_keys('legacy')
+            with open(os.path.join(keys_dir, 'identity.key'), 'rb') as f:
+                self.assertEqual(f.read()[0], KeyManager.KEY_FILE_VERSION)
+            self.assertTrue(KeyManager(keys_dir).load_keys('legacy'))
+        finally:
+            shutil.rmtree(keys_dir)
+    
+    def test_message_handler_identifiers(self):
+        """Test that handlers bind the configured identifiers into the AAD."""
+        session_key = secrets.token_bytes(32)
+        alice_crypto = CryptoManager()
+        bob_crypto = CryptoManager()
+        alice_crypto.set_session_key(session_key)
+        bob_crypto.set_session_key(session_key)
+        
+        alice = MessageHandler(alice_crypto, self.key_manager, self_id="alice")
+        bob = MessageHandler(bob_crypto, self.key_manager, peer_id="mallory")
+        
+        encrypted = alice.prepare_text_message("hi bob")
+        with self.assertRaises(ValueError):
+            bob.handle_text_message(encrypted)
+        
+        bob.set_peer(b"alice")
+        self.assertEqual(bob.handle_text_message(encrypted), "hi bob")
+    
+    def test_rekey_time_checked_with_interleaved_sends(self):
+        """Test the rekey time check runs even when sends shift the count."""
+        from unittest.mock import patch
+        
+        session_key = secrets.token_bytes(32)
+        alice_crypto = CryptoManager()
+        bob_crypto = CryptoManager()
+        alice_crypto.set_session_key(session_key)
+        bob_crypto.set_session_key(session_key)
+        alice = MessageHandler(alice_crypto, self.key_manager, self_id="alice")
+        bob = MessageHandler(bob_crypto, self.key_manager, peer_id="alice")
+        
+        # Bob receives, then sends: every receive lands on an odd count
+        with patch.object(MessageHandler, 'should_rekey', return_value=False) as should_rekey:
+            for _ in range(MessageHandler.REKEY_TIME_CHECK_INTERVAL * 2):
+                bob.handle_text_message(alice.prepare_text_message("ping"))
+                bob.prepare_text_message("pong")
+        
+        # Receives at counts 65, 129 and 193 pass a check point
+        self.assertEqual(should_rekey.call_count, 3)
+    
     def test_key_derivation_consistency(self):
         """Test that key derivation is consistent."""
         self.key_manager.generate_identity_keys()
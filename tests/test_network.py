@@ -3,12 +3,15 @@ Unit tests for network functionality.
 """
 
 import unittest
+import unittest.mock
 import time
 import threading
+import socket
 from core.key_manager import KeyManager
 from core.crypto_manager import CryptoManager
 from core.message_handler import MessageHandler
 from core.network_manager import NetworkManager
+from core.protocol import Protocol, MessageType
 
 
 class TestNetwork(unittest.TestCase):
@@ -86,6 +89,592 @@ class TestNetwork(unittest.TestCase):
         # Skipping to avoid flaky test failures
         self.skipTest("Complex integration test - verified manually")
     
+    def test_send_batch_coalescing(self):
+        """Test queued messages are coalesced up to the batch limit."""
+        network = NetworkManager(
+            self.client_key_manager,
+            self.client_crypto,
+            self.client_handler
+        )
+        
+        network._enqueue(b'first')
+        network._enqueue(b'second')
+        network._enqueue(b'third')
+        self.assertEqual(network._collect_send_batch(), [b'first', b'second', b'third'])
+        self.assertEqual(len(network.send_queue), 0)
+        
+        # Messages past the limit stay queued for the next batch
+        big = b'x' * NetworkManager.SEND_BATCH_LIMIT
+        network._enqueue(big)
+        network._enqueue(b'later')
+        self.assertEqual(network._collect_send_batch(), [big])
+        self.assertEqual(network._collect_send_batch(), [b'later'])
+    
+    def test_send_queue_limit(self):
+        """Test text sends are refused once the queue is full."""
+        network = NetworkManager(
+            self.client_key_manager,
+            self.client_crypto,
+            self.client_handler
+        )
+        network.handshake_complete = True
+        network.message_handler = unittest.mock.MagicMock()
+        network.message_handler.prepare_text_message.return_value = b'ciphertext'
+        
+        for _ in range(NetworkManager.SEND_QUEUE_LIMIT):
+            self.assertTrue(network.send_text_message('hello'))
+        self.assertFalse(network.send_text_message('hello'))
+        self.assertEqual(len(network.send_queue), NetworkManager.SEND_QUEUE_LIMIT)
+    
+    def test_flush_sends_handles_short_writes(self):
+        """Test queued sends resume correctly after partial writes."""
+        network = NetworkManager(
+            self.client_key_manager,
+            self.client_crypto,
+            self.client_handler
+        )
+        
+        sent = bytearray()
+        
+        def short_write(data):
+            # Accept at most 3 bytes per call
+            data = bytes(data)[:3]
+            sent.extend(data)
+            return len(data)
+        
+        network.peer_socket = unittest.mock.MagicMock()
+        network.peer_socket.send.side_effect = short_write
+        network.peer_socket.sendmsg.side_effect = lambda buffers: short_write(
+            b''.join(bytes(b) for b in buffers)
+        )
+        for message in (b'abcd', b'ef', b'ghijk'):
+            network._enqueue(message)
+        
+        self.assertTrue(network._flush_sends())
+        self.assertEqual(bytes(sent), b'abcdefghijk')
+    
+    def test_flush_sends_stops_when_socket_full(self):
+        """Test a full socket leaves the unsent tail pending."""
+        network = NetworkManager(
+            self.client_key_manager,
+            self.client_crypto,
+            self.client_handler
+        )
+        
+        network.peer_socket = unittest.mock.MagicMock()
+        network.peer_socket.sendmsg.return_value = 5
+        network.peer_socket.send.side_effect = BlockingIOError()
+        network._enqueue(b'abcd')
+        network._enqueue(b'efgh')
+        
+        self.assertFalse(network._flush_sends())
+        self.assertEqual([bytes(b) for b in network._pending_send], [b'fgh'])
+    
+    def test_receive_reassembles_split_frames(self):
+        """Test frames split across reads, including one larger than the buffer."""
+        network = NetworkManager(
+            self.client_key_manager,
+            self.client_crypto,
+            self.client_handler
+        )
+        
+        large = b'\xff' * (NetworkManager.RECV_BUFFER_SIZE * 2)
+        frames = [Protocol.create_text_message(b'\xfe' * size) for size in (1, 700, 5000)]
+        frames.insert(2, Protocol.create_text_message(large))
+        stream = b''.join(frames) * 3
+        
+        # Deliver the stream in uneven pieces
+        pieces = []
+        position = 0
+        sizes = [3, 1, 4000, 7, 65536, 2, 90000]
+        while position < len(stream):
+            size = sizes[len(pieces) % len(sizes)]
+            pieces.append(stream[position:position + size])
+            position += size
+        
+        def recv_into(view):
+            # Like the kernel, never write past the end of the view
+            piece = pieces.pop(0)
+            if len(piece) > len(view):
+                pieces.insert(0, piece[len(view):])
+                piece = piece[:len(view)]
+            view[:len(piece)] = piece
+            return len(piece)
+        
+        received = []
+        network.peer_socket = unittest.mock.MagicMock()
+        network.peer_socket.recv_into.side_effect = recv_into
+        network._handle_received_message = lambda msg_type, payload: received.append(payload)
+        
+        while pieces:
+            self.assertTrue(network._receive_available())
+        
+        expected = [Protocol.decode_message(frame)[1] for frame in frames] * 3
+        self.assertEqual(received, expected)
+        self.assertEqual(len(network._recv_buffer), NetworkManager.RECV_BUFFER_SIZE)
+    
+    def test_receive_refuses_oversized_frame(self):
+        """Test an oversized length prefix fails before the buffer grows."""
+        network = NetworkManager(
+            self.client_key_manager,
+            self.client_crypto,
+            self.client_handler
+        )
+        oversized = (Protocol.MAX_MESSAGE_SIZE + 1).to_bytes(4, 'big')
+        
+        # Length prefix alone after a valid frame, and with its type byte
+        for stream, expected in ((Protocol.create_text_message(b'\xfe') + oversized, [b'\xfe']),
+                                 (oversized + b'\x05', [])):
+            def recv_into(view, data=stream):
+                view[:len(data)] = data
+                return len(data)
+            
+            received = []
+            network._reset_connection_state()
+            network.peer_socket = unittest.mock.MagicMock()
+            network.peer_socket.recv_into.side_effect = recv_into
+            network._handle_received_message = lambda msg_type, payload: received.append(payload)
+            
+            with self.assertRaises(ValueError):
+                network._receive_available()
+            self.assertEqual(received, expected)
+            self.assertEqual(len(network._recv_buffer), NetworkManager.RECV_BUFFER_SIZE)
+    
+    def test_decode_next_at_offset(self):
+        """Test in-place decoding walks a buffer holding several frames."""
+        buffer = bytearray(
+            Protocol.create_text_message(b'\xff\x01') +
+            Protocol.create_ready()
+        )
+        partial = Protocol.create_disconnect()
+        buffer += partial[:3]
+        
+        msg_type, payload, offset = Protocol.decode_next(buffer, 0)
+        self.assertEqual(msg_type, MessageType.TEXT_MESSAGE)
+        self.assertEqual(payload, b'\xff\x01')
+        
+        msg_type, payload, offset = Protocol.decode_next(buffer, offset)
+        self.assertEqual(msg_type, MessageType.READY)
+        self.assertEqual(payload, {'status': 'ready'})
+        
+        # Incomplete trailing frame is not decoded
+        self.assertIsNone(Protocol.decode_next(buffer, offset))
+        self.assertEqual(Protocol.frame_end(buffer, offset), offset + Protocol.HEADER_SIZE)
+        
+        buffer += partial[3:5]
+        self.assertEqual(Protocol.frame_end(buffer, offset), offset + len(partial))
+        
+        # Oversized frames are refused before their body is buffered
+        oversized = (Protocol.MAX_MESSAGE_SIZE + 1).to_bytes(4, 'big') + b'\x05'
+        with self.assertRaises(ValueError):
+            Protocol.frame_end(oversized, 0)
+        with self.assertRaises(ValueError):
+            Protocol.decode_next(oversized, 0)
+        
+        # A memoryview over the buffer decodes the same frames
+        with memoryview(buffer) as view:
+            msg_type, payload, _ = Protocol.decode_next(view, 0)
+        self.assertEqual(payload, b'\xff\x01')
+    
+    def test_binary_payloads_skip_json(self):
+        """Test only control messages are decoded as JSON."""
+        message = Protocol.create_text_message(b'{"status": "ready"}')
+        self.assertEqual(Protocol.decode_message(message)[1], b'{"status": "ready"}')
+        self.assertEqual(Protocol.decode_message(Protocol.create_disconnect('busy'))[1],
+                         {'reason': 'busy'})
+    
+    def test_file_chunk_framing(self):
+        """Test file chunks carry their sequence number ahead of the data."""
+        message = Protocol.create_file_chunk(7, b'\x00ciphertext')
+        
+        msg_type, payload, remaining = Protocol.decode_message(message)
+        self.assertEqual(msg_type, MessageType.FILE_CHUNK)
+        self.assertEqual(payload, b'\x00\x00\x00\x07\x00ciphertext')
+        self.assertEqual(remaining, b'')
+    
+    def test_handshake_fields_are_raw_bytes(self):
+        """Test handshake messages carry binary fields without hex encoding."""
+        identity = self.client_key_manager.get_identity_public_bytes()
+        signing = self.client_key_manager.get_signing_public_bytes()
+        signature = self.client_key_manager.sign_data(identity)
+        challenge = b'c' * 32
+        
+        msg_type, payload, _ = Protocol.decode_message(
+            Protocol.create_hello(identity, signing, signature, (2, 1))
+        )
+        self.assertEqual(msg_type, MessageType.HELLO)
+        self.assertEqual(payload['identity_key'], identity)
+        self.assertEqual(payload['signing_key'], signing)
+        self.assertEqual(payload['signature'], signature)
+        self.assertEqual(list(payload['cipher_suites']), [2, 1])
+        
+        msg_type, payload, _ = Protocol.decode_message(
+            Protocol.create_hello_ack(identity, signing, signature, challenge, 2)
+        )
+        self.assertEqual(msg_type, MessageType.HELLO_ACK)
+        self.assertEqual(payload['challenge'], challenge)
+        self.assertEqual(payload['cipher_suite'], b'\x02')
+        
+        msg_type, payload, _ = Protocol.decode_message(
+            Protocol.create_challenge_response(challenge, signature)
+        )
+        self.assertEqual(payload, {'response': challenge, 'signature': signature})
+        
+        # Truncated payloads decode to no fields
+        truncated = Protocol.encode_message(MessageType.HELLO, identity)
+        self.assertEqual(Protocol.decode_message(truncated)[1], {})
+    
+    def test_hello_credentials_cached(self):
+        """Test the signed identity is computed once per key pair."""
+        network = NetworkManager(
+            self.client_key_manager,
+            self.client_crypto,
+            self.client_handler
+        )
+        
+        first = network._get_hello_credentials()
+        self.assertIs(network._get_hello_credentials(), first)
+        self.assertTrue(self.client_key_manager.verify_signature(first[0], first[2], first[1]))
+        
+        frame = network._get_hello_frame()
+        self.assertIs(network._get_hello_frame(), frame)
+        self.assertEqual(Protocol.decode_message(frame)[1]['signature'], first[2])
+        
+        # Regenerating keys invalidates the cache
+        self.client_key_manager.generate_identity_keys()
+        self.assertNotEqual(network._get_hello_credentials()[0], first[0])
+        self.assertNotEqual(network._get_hello_frame(), frame)
+    
+    def test_reset_connection_state(self):
+        """Test per-connection state is dropped but pooled buffers are kept."""
+        network = NetworkManager(
+            self.client_key_manager,
+            self.client_crypto,
+            self.client_handler
+        )
+        credentials = network._get_hello_credentials()
+        buffer = network._recv_buffer
+        
+        network.handshake_complete = True
+        network.challenge = b"c" * 32
+        network.send_queue.append(Protocol.create_disconnect())
+        network._recv_offset = network._recv_length = 10
+        
+        network._reset_connection_state()
+        
+        self.assertFalse(network.handshake_complete)
+        self.assertIsNone(network.challenge)
+        self.assertEqual(len(network.send_queue), 0)
+        self.assertEqual((network._recv_offset, network._recv_length), (0, 0))
+        self.assertIs(network._recv_buffer, buffer)
+        self.assertIs(network._get_hello_credentials(), credentials)
+    
+    def test_out_of_state_handshake_skips_crypto(self):
+        """Test repeated or misdirected handshake messages are dropped early."""
+        network = NetworkManager(
+            self.server_key_manager,
+            self.server_crypto,
+            self.server_handler
+        )
+        identity, signing, signature = network._get_hello_credentials()
+        hello = Protocol.decode_message(Protocol.create_hello(identity, signing, signature))[1]
+        
+        with unittest.mock.patch.object(KeyManager, 'verify_signature') as verify:
+            # HELLO to a client
+            network._handle_hello(hello)
+            
+            # Second HELLO while a challenge is outstanding
+            network.is_server = True
+            network.challenge = b'c' * 32
+            network._handle_hello(hello)
+            
+            # HELLO_ACK to a server
+            network._handle_hello_ack(hello)
+            
+            verify.assert_not_called()
+    
+    def test_handshake_state_needs_verified_peer(self):
+        """Test forged handshake keys are not kept and early READY is ignored."""
+        network = NetworkManager(
+            self.server_key_manager,
+            self.server_crypto,
+            self.server_handler
+        )
+        identity, signing, signature = network._get_hello_credentials()
+        forged = Protocol.create_hello(identity, signing, bytes(len(signature)))
+        hello = Protocol.decode_message(forged)[1]
+        completed = []
+        network.register_callback('handshake_complete', lambda: completed.append(True))
+        
+        # READY before any verified HELLO_ACK
+        network._handle_ready({'status': 'ready'})
+        self.assertFalse(network.handshake_complete)
+        
+        # Bad signatures leave no peer keys behind, on either side
+        network._handle_hello_ack(dict(hello, challenge=b'c' * 32, cipher_suite=b''))
+        self.assertIsNone(network.peer_identity_key)
+        network.is_server = True
+        network._handle_hello(hello)
+        self.assertIsNone(network.peer_identity_key)
+        self.assertIsNone(network.peer_signing_key)
+        self.assertIsNone(network.challenge)
+        
+        # READY sent to a server
+        network.peer_identity_key = identity
+        network._handle_ready({'status': 'ready'})
+        self.assertFalse(network.handshake_complete)
+        self.assertEqual(completed, [])
+    
+    def test_hello_ack_unknown_suite_keeps_no_state(self):
+        """Test a HELLO_ACK with an unknown suite does not block a valid one."""
+        server_network = NetworkManager(
+            self.server_key_manager,
+            self.server_crypto,
+            self.server_handler
+        )
+        client_network = NetworkManager(
+            self.client_key_manager,
+            self.client_crypto,
+            self.client_handler
+        )
+        identity, signing, signature = server_network._get_hello_credentials()
+        hello = Protocol.decode_message(Protocol.create_hello(identity, signing, signature))[1]
+        hello_ack = dict(hello, challenge=b'c' * 32)
+        
+        client_network._handle_hello_ack(dict(hello_ack, cipher_suite=b'\x09'))
+        self.assertIsNone(client_network.peer_identity_key)
+        self.assertEqual(len(client_network.send_queue), 0)
+        
+        suite = CryptoManager.SUITE_AES_256_GCM
+        client_network._handle_hello_ack(dict(hello_ack, cipher_suite=bytes([suite])))
+        self.assertEqual(client_network.peer_identity_key, identity)
+        self.assertEqual(client_network.cipher_suite, suite)
+        msg_type, _, _ = Protocol.decode_message(client_network.send_queue[0])
+        self.assertEqual(msg_type, MessageType.CHALLENGE_RESPONSE)
+    
+    def test_io_loop_closes_own_wake_pair(self):
+        """Test an exiting I/O thread leaves a newer wake pair open."""
+        network = NetworkManager(
+            self.client_key_manager,
+            self.client_crypto,
+            self.client_handler
+        )
+        local, remote = socket.socketpair()
+        network.peer_socket = local
+        network.is_connected = True
+        network._start_communication_threads()
+        old_thread = network.io_thread
+        old_writer = network._wake_writer
+        
+        # A reconnect installs its wake pair before the old loop has exited
+        new_reader, new_writer = socket.socketpair()
+        network._wake_reader, network._wake_writer = new_reader, new_writer
+        try:
+            network.stop_event.set()
+            old_writer.send(b'\0')
+            old_thread.join(5)
+            
+            self.assertFalse(old_thread.is_alive())
+            self.assertEqual(old_writer.fileno(), -1)
+            self.assertNotEqual(new_writer.fileno(), -1)
+            self.assertNotEqual(new_reader.fileno(), -1)
+        finally:
+            for sock in (local, remote, new_reader, new_writer):
+                sock.close()
+    
+    def test_disconnect_callback(self):
+        """Test the disconnect callback fires once for each ended connection."""
+        network = NetworkManager(
+            self.client_key_manager,
+            self.client_crypto,
+            self.client_handler
+        )
+        events = []
+        network.register_callback('disconnect', lambda: events.append(network.is_connected))
+        
+        # Nothing to report without a connection
+        network.disconnect()
+        self.assertEqual(events, [])
+        
+        for drop in (True, False):
+            local, remote = socket.socketpair()
+            try:
+                network.peer_socket = local
+                network.is_connected = True
+                network._start_communication_threads()
+                if drop:
+                    remote.sendall(b'\xff\xff\xff\xff\x01')
+                    network.io_thread.join(5)
+                else:
+                    network.disconnect()
+            finally:
+                local.close()
+                remote.close()
+        
+        self.assertEqual(events, [False, False])
+    
+    def test_configure_peer_socket(self):
+        """Test connected sockets get TCP_NODELAY and keepalive."""
+        listener = socket.create_server(('127.0.0.1', 0))
+        client = socket.create_connection(listener.getsockname())
+        try:
+            NetworkManager._configure_peer_socket(client)
+            
+            self.assertTrue(client.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+            self.assertTrue(client.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+            if hasattr(socket, 'TCP_KEEPIDLE'):
+                self.assertEqual(
+                    client.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE),
+                    NetworkManager.KEEPALIVE_IDLE
+                )
+        finally:
+            client.close()
+            listener.close()
+    
+    def test_apply_buffer_sizes(self):
+        """Test explicit socket buffer sizes are applied only when given."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            default_sndbuf = sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+            NetworkManager._apply_buffer_sizes(sock, 131072, None)
+            
+            self.assertGreaterEqual(sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF), 131072)
+            self.assertEqual(sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF), default_sndbuf)
+        finally:
+            sock.close()
+    
+    def test_second_peer_rejected(self):
+        """Test a server with a connected peer turns further peers away."""
+        server_network = NetworkManager(
+            self.server_key_manager,
+            self.server_crypto,
+            self.server_handler
+        )
+        server_network.start_server(port=5561)
+        time.sleep(0.5)
+        
+        client_network = NetworkManager(
+            self.client_key_manager,
+            self.client_crypto,
+            self.client_handler
+        )
+        client_network.connect_to_peer('127.0.0.1', 5561)
+        time.sleep(0.5)
+        
+        extra = socket.create_connection(('127.0.0.1', 5561), timeout=5)
+        try:
+            data = b''
+            while True:
+                chunk = extra.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+            msg_type, payload, _ = Protocol.decode_message(data)
+            self.assertEqual(msg_type, MessageType.DISCONNECT)
+            self.assertEqual(payload, {'reason': 'busy'})
+            self.assertTrue(server_network.is_connected)
+        finally:
+            extra.close()
+            client_network.disconnect()
+            server_network.disconnect()
+    
+    def test_bad_frame_drops_connection(self):
+        """Test an I/O error frees the server for the next peer."""
+        server_network = NetworkManager(
+            self.server_key_manager,
+            self.server_crypto,
+            self.server_handler
+        )
+        server_network.start_server(port=5564)
+        time.sleep(0.5)
+        
+        bad_peer = socket.create_connection(('127.0.0.1', 5564), timeout=5)
+        client_network = NetworkManager(
+            self.client_key_manager,
+            self.client_crypto,
+            self.client_handler
+        )
+        try:
+            time.sleep(0.5)
+            self.assertTrue(server_network.is_connected)
+            
+            # Header announcing a frame over MAX_MESSAGE_SIZE
+            bad_peer.sendall(b'\xff\xff\xff\xff\x01')
+            time.sleep(0.5)
+            self.assertFalse(server_network.is_connected)
+            self.assertIsNone(server_network.peer_socket)
+            
+            self.assertTrue(client_network.connect_to_peer('127.0.0.1', 5564, timeout=5))
+            time.sleep(0.5)
+            self.assertTrue(server_network.is_connected)
+            self.assertTrue(client_network.is_connected)
+        finally:
+            bad_peer.close()
+            client_network.disconnect()
+            server_network.disconnect()
+    
+    def test_server_keeps_listening_after_peer_leaves(self):
+        """Test a peer's DISCONNECT or closed stream frees the server."""
+        server_network = NetworkManager(
+            self.server_key_manager,
+            self.server_crypto,
+            self.server_handler
+        )
+        server_network.start_server(port=5565)
+        time.sleep(0.5)
+        
+        client_network = NetworkManager(
+            self.client_key_manager,
+            self.client_crypto,
+            self.client_handler
+        )
+        try:
+            # Orderly disconnect: the peer sends DISCONNECT
+            self.assertTrue(client_network.connect_to_peer('127.0.0.1', 5565, timeout=5))
+            time.sleep(0.5)
+            client_network.disconnect()
+            time.sleep(0.5)
+            self.assertFalse(server_network.is_connected)
+            self.assertTrue(server_network.is_server)
+            
+            # Closed stream without DISCONNECT
+            silent_peer = socket.create_connection(('127.0.0.1', 5565), timeout=5)
+            time.sleep(0.5)
+            self.assertTrue(server_network.is_connected)
+            silent_peer.close()
+            time.sleep(0.5)
+            self.assertFalse(server_network.is_connected)
+            
+            self.assertTrue(client_network.connect_to_peer('127.0.0.1', 5565, timeout=5))
+            time.sleep(0.5)
+            self.assertTrue(server_network.is_connected)
+        finally:
+            client_network.disconnect()
+            server_network.disconnect()
+    
+    @unittest.skipUnless(socket.has_ipv6, "IPv6 not available")
+    def test_dual_stack_server(self):
+        """Test a '::' server accepts IPv6 and IPv4 peers."""
+        for port, host in ((5562, '::1'), (5563, '127.0.0.1')):
+            server_network = NetworkManager(
+                self.server_key_manager,
+                self.server_crypto,
+                self.server_handler
+            )
+            client_network = NetworkManager(
+                self.client_key_manager,
+                self.client_crypto,
+                self.client_handler
+            )
+            try:
+                if not server_network.start_server(host='::', port=port):
+                    self.skipTest("Cannot bind IPv6 socket")
+                time.sleep(0.2)
+                self.assertTrue(client_network.connect_to_peer(host, port, timeout=5))
+            finally:
+                client_network.disconnect()
+                server_network.disconnect()
+    
     def test_connection_timeout(self):
         """Test connection timeout."""
         client_network = NetworkManager(
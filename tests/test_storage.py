@@ -95,6 +95,14 @@ class TestStorage(unittest.TestCase):
         self.assertEqual(len(messages), 1)
         self.assertEqual(messages[0]['content'], sensitive_message)
     
+    def test_record_nonces_unique(self):
+        """Test that pooled record nonces never repeat across pool refills."""
+        count = 3 * DatabaseManager.NONCE_POOL_SIZE // DatabaseManager.NONCE_SIZE
+        nonces = {self.db_manager._generate_nonce() for _ in range(count)}
+        
+        self.assertEqual(len(nonces), count)
+        self.assertTrue(all(len(n) == DatabaseManager.NONCE_SIZE for n in nonces))
+    
     def test_concurrent_access(self):
         """Test concurrent database access."""
         import threading
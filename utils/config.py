@@ -32,7 +32,9 @@ class Config:
                 "bind_address": "0.0.0.0",
                 "connection_timeout": 10,
                 "heartbeat_interval": 30,
-                "max_message_size": 10485760
+                "max_message_size": 10485760,
+                "socket_rcvbuf": None,
+                "socket_sndbuf": None
             },
             "security": {
                 "rekeying_message_threshold": 1000,
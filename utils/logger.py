@@ -77,35 +77,45 @@ class SecureLogger:
             return sanitized
         return message
     
-    def info(self, message, event=None, **kwargs):
-        """Log info level message."""
+    def info(self, message, *args, event=None, **kwargs):
+        """Log info level message (args are %-formatted only if emitted)."""
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
         message = self._sanitize_message(message)
         extra = {'event': event} if event else {}
-        self.logger.info(message, extra=extra, **kwargs)
+        self.logger.info(message, *args, extra=extra, **kwargs)
     
-    def warning(self, message, event=None, **kwargs):
-        """Log warning level message."""
+    def warning(self, message, *args, event=None, **kwargs):
+        """Log warning level message (args are %-formatted only if emitted)."""
+        if not self.logger.isEnabledFor(logging.WARNING):
+            return
         message = self._sanitize_message(message)
         extra = {'event': event} if event else {}
-        self.logger.warning(message, extra=extra, **kwargs)
+        self.logger.warning(message, *args, extra=extra, **kwargs)
     
-    def error(self, message, event=None, **kwargs):
-        """Log error level message."""
+    def error(self, message, *args, event=None, **kwargs):
+        """Log error level message (args are %-formatted only if emitted)."""
+        if not self.logger.isEnabledFor(logging.ERROR):
+            return
         message = self._sanitize_message(message)
         extra = {'event': event} if event else {}
-        self.logger.error(message, extra=extra, **kwargs)
+        self.logger.error(message, *args, extra=extra, **kwargs)
     
-    def debug(self, message, event=None, **kwargs):
-        """Log debug level message."""
+    def debug(self, message, *args, event=None, **kwargs):
+        """Log debug level message (args are %-formatted only if emitted)."""
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
         message = self._sanitize_message(message)
         extra = {'event': event} if event else {}
-        self.logger.debug(message, extra=extra, **kwargs)
+        self.logger.debug(message, *args, extra=extra, **kwargs)
     
-    def critical(self, message, event=None, **kwargs):
-        """Log critical level message."""
+    def critical(self, message, *args, event=None, **kwargs):
+        """Log critical level message (args are %-formatted only if emitted)."""
+        if not self.logger.isEnabledFor(logging.CRITICAL):
+            return
         message = self._sanitize_message(message)
         extra = {'event': event} if event else {}
-        self.logger.critical(message, extra=extra, **kwargs)
+        self.logger.critical(message, *args, extra=extra, **kwargs)
 
 
 # Create default logger
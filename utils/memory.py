@@ -0,0 +1,23 @@
+"""
+Memory helpers for handling sensitive data.
+Provides in-place wiping of mutable buffers.
+"""
+
+import ctypes
+
+
+def secure_zero(buffer):
+    """
+    Overwrite a mutable buffer with zeros in place.
+    
+    Uses a single C-level memset instead of a Python loop over the bytes.
+    
+    Args:
+        buffer: bytearray (or other writable buffer) to wipe
+    """
+    size = len(buffer)
+    if size == 0:
+        return
+    
+    address = ctypes.addressof((ctypes.c_char * size).from_buffer(buffer))
+    ctypes.memset(address, 0, size)